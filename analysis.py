@@ -1,6 +1,20 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import hashlib
+import io
+import math
+import os
+import pickle
+import shutil
+import time
+import weakref
+
 import numpy as np
 import pandas as pd
-from scipy.stats import chi2_contingency, fisher_exact
+import requests
+from scipy import sparse
+from scipy.stats import chi2 as chi2_dist, fisher_exact, norm
 
 def interpret_p_value(p):
     if p < 0.001:
@@ -76,64 +90,754 @@ def interpret_goodman_kruskal_tau(tau):
     else:
         return "Сильная ассоциация"
 
+def _screen_pairs_worker(shm_name, shape, n_levels, pairs):
+    # Выполняется в дочернем процессе: коды столбцов читаются из общей памяти
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        codes = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+        results = []
+        for i, j in pairs:
+            table = PracticeAnalysis._pair_table(codes[i].astype(np.int64), n_levels[i],
+                                                 codes[j].astype(np.int64), n_levels[j])
+            if min(table.shape) < 2:
+                results.append((i, j, None))
+                continue
+            stats = PracticeAnalysis._table_stats(table)
+            result = {'Хи-квадрат': stats['chi2'],
+                      'p-значение': stats['p'],
+                      'Коэффициент Крамера V': PracticeAnalysis._cramers_v(table, stats)}
+            if table.shape == (2, 2):
+                result['p-значение (Фишер)'] = fisher_exact(table)[1]
+            results.append((i, j, result))
+        return results
+    finally:
+        shm.close()
+
+class SparseContingencyTable:
+    # Таблица сопряженности в формате CSR по кодам категорий: хранятся только
+    # ненулевые частоты, подписи строк и столбцов - как у pd.crosstab
+    def __init__(self, counts, index, columns):
+        self.counts = sparse.csr_array(counts)
+        self.index = index
+        self.columns = columns
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def to_frame(self, max_rows=None, max_cols=None):
+        # Плотная таблица из самых частых строк и столбцов (для отображения)
+        rows = np.arange(self.shape[0])
+        cols = np.arange(self.shape[1])
+        if max_rows is not None and max_rows < len(rows):
+            totals = np.asarray(self.counts.sum(axis=1)).ravel()
+            rows = np.sort(np.argsort(-totals, kind='stable')[:max_rows])
+        if max_cols is not None and max_cols < len(cols):
+            totals = np.asarray(self.counts.sum(axis=0)).ravel()
+            cols = np.sort(np.argsort(-totals, kind='stable')[:max_cols])
+        dense = self.counts[rows][:, cols].toarray()
+        return pd.DataFrame(dense, index=self.index[rows], columns=self.columns[cols])
+
+class ContingencyCounts:
+    # Частоты наблюдаемых сочетаний значений выбранных столбцов. Счетчики можно
+    # строить независимо на частях данных и объединять сложением: метки категорий
+    # выравниваются, порядок объединения не важен
+    def __init__(self, columns, counts=None):
+        if len(columns) < 2:
+            raise ValueError("Необходимо выбрать минимум два столбца")
+        self.columns = list(columns)
+        self.counts = None
+        self._add(counts)
+
+    @classmethod
+    def from_frame(cls, df, columns):
+        return cls(columns).update(df)
+
+    @classmethod
+    def from_table(cls, table):
+        # Счетчики из готовой таблицы сопряженности (pd.crosstab или разреженной)
+        if isinstance(table, SparseContingencyTable):
+            cells = table.counts.tocoo()
+            rows, cols, data = cells.row, cells.col, cells.data
+        else:
+            values = table.to_numpy()
+            rows, cols = np.nonzero(values)
+            data = values[rows, cols]
+        row_labels = table.index[rows]
+        arrays = [row_labels.get_level_values(i) for i in range(row_labels.nlevels)] + [table.columns[cols]]
+        columns = list(table.index.names) + [table.columns.name]
+        counts = pd.Series(np.asarray(data, dtype=np.int64),
+                           index=pd.MultiIndex.from_arrays(arrays, names=columns))
+        return cls(columns, counts)
+
+    def _add(self, part):
+        if part is None or part.empty:
+            return
+        if self.counts is None:
+            self.counts = part.astype(np.int64)
+        else:
+            self.counts = self.counts.add(part, fill_value=0).astype(np.int64)
+
+    def update(self, df):
+        self._add(df.groupby(self.columns, sort=False).size())
+        return self
+
+    def merge(self, other):
+        if other.columns != self.columns:
+            raise ValueError("Счетчики построены по разным столбцам")
+        merged = ContingencyCounts(self.columns, self.counts)
+        merged._add(other.counts)
+        return merged
+
+    __add__ = merge
+
+    @property
+    def total(self):
+        return 0 if self.counts is None else int(self.counts.sum())
+
+    def to_table(self, max_dense_cells=1_000_000):
+        # Плотная таблица как у pd.crosstab или разреженная, если она слишком велика
+        if self.counts is None:
+            raise ValueError("В выбранных столбцах нет данных")
+        codes, levels = PracticeAnalysis._factorize_columns(self.counts.index.to_frame(index=False), self.columns)
+        table = PracticeAnalysis._table_from_codes(codes, levels, self.columns, self.counts.to_numpy())
+        if table.shape[0] * table.shape[1] <= max_dense_cells:
+            return table.to_frame()
+        return table
+
+class AnalysisCache:
+    # LRU-кэш результатов методов анализа. Ключ - версия кода методов, хэш
+    # содержимого таблицы (частоты и структура индекса), имя метода и параметры.
+    # Размер ограничен числом записей и суммарным объемом результатов (по размеру
+    # pickle). Если задан path, кэш загружается из файла и сохраняется в него после
+    # каждого изменения, но в файл попадают только последние записи не больше
+    # max_saved_entry_bytes общим объемом до max_saved_bytes: большие результаты
+    # (например, ожидаемые частоты больших таблиц) хранятся лишь в памяти. VERSION увеличивается при изменении
+    # результатов методов, и записи, сохраненные прежними версиями, не используются
+    VERSION = 1
+
+    def __init__(self, max_entries=128, path=None, max_bytes=64 * 2 ** 20, max_saved_bytes=2 ** 20,
+                 max_saved_entry_bytes=64 * 2 ** 10):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_saved_bytes = max_saved_bytes
+        self.max_saved_entry_bytes = max_saved_entry_bytes
+        self.path = path
+        self._entries = OrderedDict()
+        self._bytes = 0
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    entries = pickle.load(f)
+                for key, (result, size) in entries.items():
+                    if key[0] == self.VERSION:
+                        self._entries[key] = (result, size)
+                        self._bytes += size
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError,
+                    IndexError, KeyError):
+                self._entries = OrderedDict()
+                self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def table_key(table):
+        digest = hashlib.blake2b(digest_size=16)
+        if isinstance(table, SparseContingencyTable):
+            counts = table.counts
+            for part in (counts.indptr, counts.indices, counts.data):
+                digest.update(np.ascontiguousarray(part).tobytes())
+            labels = [table.index, table.columns]
+        elif sparse.issparse(table):
+            table = sparse.csr_array(table)
+            for part in (table.indptr, table.indices, table.data):
+                digest.update(np.ascontiguousarray(part).tobytes())
+            labels = []
+        else:
+            values = np.asarray(table)
+            if values.dtype == object:
+                values = values.astype(float)
+            digest.update(str(values.dtype).encode())
+            digest.update(np.ascontiguousarray(values).tobytes())
+            labels = [table.index, table.columns] if isinstance(table, pd.DataFrame) else []
+        digest.update(repr(np.shape(table)).encode())
+        for label in labels:
+            digest.update(pd.util.hash_pandas_object(label, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def get_or_compute(self, table, method_name, method, **params):
+        key = (self.VERSION, self.table_key(table), method_name, repr(sorted(params.items())))
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+        result = method(table, **params)
+        try:
+            size = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return result
+        if size > self.max_bytes:
+            return result
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+        self._save()
+        return result
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        # Последние небольшие записи, помещающиеся в max_saved_bytes
+        saved, total = [], 0
+        for key, (result, size) in reversed(self._entries.items()):
+            if size <= self.max_saved_entry_bytes and total + size <= self.max_saved_bytes:
+                saved.append((key, (result, size)))
+                total += size
+        # Запись через временный файл, чтобы не оставить поврежденный кэш
+        tmp_path = f'{self.path}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(OrderedDict(reversed(saved)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+class DatasetCache:
+    # Кэш загруженных наборов данных в колоночном двоичном виде: каждый столбец -
+    # отдельный .npy (строки хранятся кодами категорий), при повторной загрузке
+    # файлы отображаются в память. Запись привязана к источнику (путь или URL)
+    # и его версии (mtime и размер файла или ETag). Каждая версия пишется в свой
+    # каталог, а latest.pkl указывает на последнюю: файлы прежней версии могут быть
+    # еще отображены в память используемым DataFrame, и в Windows их нельзя удалить,
+    # поэтому старые версии удаляются по возможности при следующей записи.
+    # DataFrame из кэша доступен только для чтения: запись значений в него
+    # (df.loc[...] = ...) вызывает ошибку, для изменения нужна копия df.copy()
+    def __init__(self, root):
+        self.root = root
+
+    def _entry_dir(self, source):
+        return os.path.join(self.root, hashlib.sha1(str(source).encode()).hexdigest())
+
+    def _read_latest(self, source):
+        try:
+            with open(os.path.join(self._entry_dir(source), 'latest.pkl'), 'rb') as f:
+                latest = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return latest if latest['source'] == source else None
+
+    def version(self, source):
+        latest = self._read_latest(source)
+        return None if latest is None else latest['version']
+
+    def load(self, source, version):
+        latest = self._read_latest(source)
+        if latest is None or latest['version'] != version:
+            return None
+        entry = os.path.join(self._entry_dir(source), latest['dir'])
+        data = {}
+        try:
+            with open(os.path.join(entry, 'meta.pkl'), 'rb') as f:
+                meta = pickle.load(f)
+            for i, (name, categories) in enumerate(meta['columns']):
+                values = np.load(os.path.join(entry, f'{i}.npy'), mmap_mode='r')
+                if categories is None:
+                    data[name] = values
+                else:
+                    data[name] = pd.Categorical.from_codes(values, categories=categories)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return pd.DataFrame(data, index=pd.RangeIndex(meta['rows']), columns=[c for c, _ in meta['columns']],
+                            copy=False)
+
+    def store(self, source, version, df):
+        # Запись во временный каталог с последующим переименованием; имя каталога
+        # уникально, поэтому файлы, отображенные в память, не перезаписываются
+        entry = self._entry_dir(source)
+        name = f'{hashlib.sha1(str(version).encode()).hexdigest()[:16]}-{os.getpid()}-{time.time_ns()}'
+        tmp_dir = os.path.join(entry, f'{name}.tmp')
+        os.makedirs(tmp_dir)
+        columns = []
+        for i, column_name in enumerate(df.columns):
+            column = df.iloc[:, i]
+            if (pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column)
+                    or pd.api.types.is_datetime64_dtype(column)) and column.dtype != object \
+                    and not isinstance(column.dtype, pd.CategoricalDtype):
+                values, categories = column.to_numpy(), None
+            else:
+                column = column.astype('category')
+                values, categories = column.cat.codes.to_numpy(), column.cat.categories
+            np.save(os.path.join(tmp_dir, f'{i}.npy'), values)
+            columns.append((column_name, categories))
+        with open(os.path.join(tmp_dir, 'meta.pkl'), 'wb') as f:
+            pickle.dump({'rows': len(df), 'columns': columns}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_dir, os.path.join(entry, name))
+        latest_path = os.path.join(entry, 'latest.pkl')
+        with open(f'{latest_path}.{name}.tmp', 'wb') as f:
+            pickle.dump({'source': source, 'version': version, 'dir': name}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{latest_path}.{name}.tmp', latest_path)
+        # Прежние версии: удаление не удастся, пока их файлы отображены в память
+        for other in os.listdir(entry):
+            path = os.path.join(entry, other)
+            if other == name or other == 'latest.pkl' or other.endswith('.tmp'):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
 class PracticeAnalysis:
+    _codes_cache = {}
+
     @staticmethod
-    def _cramers_v(table):
-        chi2 = chi2_contingency(table)[0]
-        n = table.sum().sum()
-        phi2 = chi2 / n
-        r, k = table.shape
-        return np.sqrt(phi2 / min((k - 1), (r - 1)))
+    def _table_stats(table):
+        # Наблюдаемые и ожидаемые частоты, маргиналы и хи-квадрат за один проход
+        if isinstance(table, SparseContingencyTable):
+            table = table.counts
+        if sparse.issparse(table):
+            if table.shape != (2, 2):
+                return PracticeAnalysis._sparse_table_stats(table)
+            table = table.toarray()
+        observed = np.asarray(table, dtype=float)
+        if observed.ndim != 2:
+            raise ValueError("Таблица сопряженности должна быть двумерной")
+        row_sums = observed.sum(axis=1)
+        col_sums = observed.sum(axis=0)
+        n = row_sums.sum()
+        if n == 0 or np.any(row_sums == 0) or np.any(col_sums == 0):
+            raise ValueError("Таблица содержит нулевые строки или столбцы")
+        expected = np.outer(row_sums, col_sums) / n
+        dof = (observed.shape[0] - 1) * (observed.shape[1] - 1)
+        if dof == 0:
+            chi2, p = 0.0, 1.0
+        else:
+            # Поправка Йейтса для таблиц 2x2, как в chi2_contingency
+            if dof == 1:
+                diff = expected - observed
+                observed_corr = observed + np.sign(diff) * np.minimum(0.5, np.abs(diff))
+            else:
+                observed_corr = observed
+            chi2 = float(np.sum((observed_corr - expected) ** 2 / expected))
+            p = float(chi2_dist.sf(chi2, dof))
+        return {'observed': observed, 'expected': expected,
+                'row_sums': row_sums, 'col_sums': col_sums, 'n': n,
+                'chi2': chi2, 'p': p, 'dof': dof}
 
     @staticmethod
-    def _contingency_coefficient(table):
-        chi2 = chi2_contingency(table)[0]
-        total = table.sum().sum()
-        return np.sqrt(chi2 / (chi2 + total))
+    def _sparse_table_stats(table):
+        # Ожидаемые частоты считаются только для ненулевых ячеек; вклад нулевых
+        # ячеек в хи-квадрат равен сумме их ожидаемых частот, т.е. n - sum(e_nz)
+        observed = sparse.csr_array(table, dtype=float)
+        observed.sum_duplicates()
+        row_sums = np.asarray(observed.sum(axis=1)).ravel()
+        col_sums = np.asarray(observed.sum(axis=0)).ravel()
+        n = row_sums.sum()
+        if n == 0 or np.any(row_sums == 0) or np.any(col_sums == 0):
+            raise ValueError("Таблица содержит нулевые строки или столбцы")
+        cells = observed.tocoo()
+        expected = row_sums[cells.row] * col_sums[cells.col] / n
+        dof = (observed.shape[0] - 1) * (observed.shape[1] - 1)
+        if dof == 0:
+            chi2, p = 0.0, 1.0
+        else:
+            chi2 = float(np.sum((cells.data - expected) ** 2 / expected) + max(n - expected.sum(), 0.0))
+            p = float(chi2_dist.sf(chi2, dof))
+        return {'observed': observed, 'expected': None,
+                'row_sums': row_sums, 'col_sums': col_sums, 'n': n,
+                'chi2': chi2, 'p': p, 'dof': dof}
+
+    @staticmethod
+    def _cramers_v(table, stats=None):
+        stats = stats or PracticeAnalysis._table_stats(table)
+        r, k = stats['observed'].shape
+        return np.sqrt(stats['chi2'] / stats['n'] / min((k - 1), (r - 1)))
+
+    @staticmethod
+    def _contingency_coefficient(table, stats=None):
+        stats = stats or PracticeAnalysis._table_stats(table)
+        return np.sqrt(stats['chi2'] / (stats['chi2'] + stats['n']))
 
     @staticmethod
     def _phi_coefficient(table):
         if table.shape != (2, 2):
             raise ValueError("Phi coefficient requires 2x2 table")
-        a, b = table.values[0]
-        c, d = table.values[1]
+        a, b = np.asarray(table)[0]
+        c, d = np.asarray(table)[1]
         return (a * d - b * c) / np.sqrt((a + b) * (c + d) * (a + c) * (b + d))
 
     @staticmethod
     def _odds_ratio(table):
         if table.shape != (2, 2):
             raise ValueError("Odds ratio requires 2x2 table")
-        a, b = table.values[0]
-        c, d = table.values[1]
+        a, b = np.asarray(table)[0]
+        c, d = np.asarray(table)[1]
         return (a * d) / (b * c)
 
     @staticmethod
-    def _goodman_kruskal_tau(table):
-        chi2 = chi2_contingency(table)[0]
-        n = table.sum().sum()
-        total_sum = n * (np.prod(table.shape) - 1)
-        return chi2 / total_sum if total_sum != 0 else 0
+    def _goodman_kruskal_tau(table, stats=None):
+        stats = stats or PracticeAnalysis._table_stats(table)
+        r, k = stats['observed'].shape
+        total_sum = stats['n'] * (r * k - 1)
+        return stats['chi2'] / total_sum if total_sum != 0 else 0
 
     @staticmethod
-    def load_data(file_path):
-        return pd.read_csv(file_path)
+    def _factorize_columns(df, columns):
+        # Коды категорий (-1 для пропусков) и количество уровней для каждого столбца
+        codes, levels = {}, {}
+        for col in columns:
+            try:
+                col_codes, uniques = pd.factorize(df[col], sort=True)
+            except TypeError:
+                col_codes, uniques = pd.factorize(df[col])
+            codes[col] = col_codes.astype(np.int64)
+            levels[col] = uniques
+        return codes, levels
 
     @staticmethod
-    def create_contingency_table(df, columns):
+    def _categorical_columns(df, max_levels=50):
+        columns = []
+        for col in df.columns:
+            if pd.api.types.is_float_dtype(df[col]):
+                continue
+            # Ограничение числа уровней относится и к текстовым столбцам: идентификаторы
+            # и свободный текст дали бы таблицы из тысяч строк
+            if df[col].nunique() <= max_levels:
+                columns.append(col)
+        return columns
+
+    @staticmethod
+    def _pair_table(codes_a, n_a, codes_b, n_b):
+        # Считаются только наблюдаемые сочетания кодов, а не все n_a * n_b ячеек;
+        # как и pd.crosstab, ненаблюдаемые уровни в таблицу не попадают
+        mask = (codes_a >= 0) & (codes_b >= 0)
+        keys, counts = np.unique(codes_a[mask] * n_b + codes_b[mask], return_counts=True)
+        rows, row_codes = np.unique(keys // n_b, return_inverse=True)
+        cols, col_codes = np.unique(keys % n_b, return_inverse=True)
+        table = np.zeros((len(rows), len(cols)), dtype=np.int64)
+        table[row_codes, col_codes] = counts
+        return table
+
+    @staticmethod
+    def _column_values(column):
+        # Массив, в котором хранятся значения столбца: для столбцов NumPy обертка
+        # .array создается заново при каждом обращении, поэтому берется сам ndarray
+        values = column.array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = values.to_numpy()
+        return values
+
+    @staticmethod
+    def _same_values(cached, current):
+        if cached is current:
+            return True
+        # Представления одного и того же буфера NumPy. Кэш держит ссылку на столбец,
+        # поэтому освобожденный адрес не может достаться новому столбцу
+        return (isinstance(cached, np.ndarray) and isinstance(current, np.ndarray)
+                and cached.__array_interface__ == current.__array_interface__)
+
+    @staticmethod
+    def _cached_codes(df, columns):
+        # Коды категорий вычисляются один раз для каждого столбца загруженного
+        # DataFrame и переиспользуются при любом другом выборе столбцов. Вместе с
+        # кодами хранится сам столбец: после замены столбца (df[col] = ...) его
+        # массив значений другой, и коды вычисляются заново. При Copy-on-Write
+        # (по умолчанию с pandas 3.0) то же происходит и после записи отдельных
+        # значений (df.loc[...] = ...); без него такую запись кэш не замечает, поэтому
+        # кэш используется только по явному запросу (use_cache в create_contingency_table)
+        key = id(df)
+        entry = PracticeAnalysis._codes_cache.get(key)
+        if entry is None or entry[0]() is not df:
+            entry = (weakref.ref(df), {})
+            PracticeAnalysis._codes_cache[key] = entry
+            weakref.finalize(df, PracticeAnalysis._codes_cache.pop, key, None)
+        cached = entry[1]
+        missing = [c for c in columns if c not in cached or not PracticeAnalysis._same_values(
+            PracticeAnalysis._column_values(cached[c][2]), PracticeAnalysis._column_values(df[c]))]
+        if missing:
+            codes, levels = PracticeAnalysis._factorize_columns(df, missing)
+            for c in missing:
+                cached[c] = (codes[c], levels[c], df[c])
+        return {c: cached[c][0] for c in columns}, {c: cached[c][1] for c in columns}
+
+    @staticmethod
+    def _row_index(row_keys, levels, index_cols):
+        # Подписи строк по смешанным (mixed-radix) ключам сочетаний категорий
+        digits = np.unravel_index(row_keys, [len(levels[c]) for c in index_cols])
+        if len(index_cols) == 1:
+            return pd.Index(levels[index_cols[0]][digits[0]], name=index_cols[0])
+        return pd.MultiIndex.from_arrays([levels[c][d] for c, d in zip(index_cols, digits)],
+                                         names=index_cols)
+
+    @staticmethod
+    def _table_from_codes(codes, levels, columns, weights=None):
+        # Разреженная таблица по кодам категорий: строки - наблюдаемые сочетания
+        # всех столбцов, кроме последнего; пропуски (-1) отбрасываются
+        index_cols = columns[:-1]
+        column_col = columns[-1]
+        mask = np.all([codes[c] >= 0 for c in columns], axis=0)
+        weights = np.ones(int(mask.sum()), dtype=np.int64) if weights is None else np.asarray(weights)[mask]
+        dims = [len(levels[c]) for c in index_cols]
+        row_keys, row_codes = np.unique(np.ravel_multi_index([codes[c][mask] for c in index_cols], dims),
+                                        return_inverse=True)
+        col_keys, col_codes = np.unique(codes[column_col][mask], return_inverse=True)
+        counts = sparse.coo_array((weights, (row_codes.ravel(), col_codes.ravel())),
+                                  shape=(len(row_keys), len(col_keys))).tocsr()
+        index = PracticeAnalysis._row_index(row_keys, levels, index_cols)
+        return SparseContingencyTable(counts, index, pd.Index(levels[column_col][col_keys], name=column_col))
+
+    @staticmethod
+    def load_data(file_path, cache=None):
+        # С кэшем столбцы отображаются из файлов .npy и доступны только для чтения
+        if cache is None:
+            return pd.read_csv(file_path)
+        stat = os.stat(file_path)
+        source = os.path.abspath(file_path)
+        version = f'{stat.st_mtime_ns}-{stat.st_size}'
+        df = cache.load(source, version)
+        if df is None:
+            cache.store(source, version, pd.read_csv(file_path))
+            df = cache.load(source, version)
+        return df
+
+    @staticmethod
+    def optimize_dtypes(df, max_category_ratio=0.5):
+        # Текстовые столбцы с малой долей различных значений переводятся в category,
+        # целые понижаются до наименьшего типа, вещественные - до float32, если
+        # значения представимы без потери точности
+        before = int(df.memory_usage(deep=True).sum())
+        optimized = df.copy(deep=False)
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            if isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(column):
+                continue
+            if pd.api.types.is_integer_dtype(column):
+                optimized.isetitem(i, pd.to_numeric(column, downcast='integer'))
+            elif pd.api.types.is_float_dtype(column):
+                narrow = column.astype(np.float32)
+                if np.array_equal(narrow.to_numpy(dtype=np.float64), column.to_numpy(dtype=np.float64), equal_nan=True):
+                    optimized.isetitem(i, narrow)
+            elif pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+                if len(column) and column.nunique() <= max_category_ratio * len(column):
+                    optimized.isetitem(i, column.astype('category'))
+        return optimized, before, int(optimized.memory_usage(deep=True).sum())
+
+    @staticmethod
+    def load_remote_data(url, cache=None, timeout=30):
+        # Условный запрос по сохраненному ETag: при ответе 304 данные берутся из кэша
+        etag = cache.version(url) if cache is not None else None
+        headers = {'If-None-Match': etag} if etag else {}
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            df = cache.load(url, etag)
+            if df is not None:
+                return df
+            response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        df = pd.read_csv(io.StringIO(response.text))
+        etag = response.headers.get('ETag')
+        if cache is None or not etag:
+            return df
+        cache.store(url, etag, df)
+        return cache.load(url, etag)
+
+    @staticmethod
+    def bin_column(values, method='equal_width', bins=10, edges=None):
+        # Разбиение числового столбца на интервалы [a; b), последний включает правую
+        # границу; номер интервала ищется np.searchsorted сразу по всему столбцу
+        x = np.asarray(values, dtype=float)
+        finite = x[np.isfinite(x)]
+        if method == 'custom':
+            edges = np.unique(np.asarray(edges, dtype=float))
+            if len(edges) < 2:
+                raise ValueError("Нужно задать минимум две границы интервалов")
+        elif not len(finite):
+            raise ValueError("В столбце нет числовых значений")
+        elif method == 'quantile':
+            edges = np.unique(np.quantile(finite, np.linspace(0, 1, bins + 1)))
+        elif method == 'equal_width':
+            edges = np.unique(np.linspace(finite.min(), finite.max(), bins + 1))
+        else:
+            raise ValueError(f"Неизвестный способ разбиения: {method}")
+        if len(edges) == 1:
+            edges = np.repeat(edges, 2)
+        codes = np.searchsorted(edges, x, side='right') - 1
+        codes[x == edges[-1]] = len(edges) - 2
+        codes[(codes < 0) | (codes > len(edges) - 2) | ~np.isfinite(x)] = -1
+        for digits in range(3, 17):
+            bounds = [f'{e:.{digits}g}' for e in edges]
+            if len(set(bounds)) == len(set(edges.tolist())):
+                break
+        labels = [f'[{a}; {b})' for a, b in zip(bounds[:-2], bounds[1:-1])] + [f'[{bounds[-2]}; {bounds[-1]}]']
+        binned = pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+        if isinstance(values, pd.Series):
+            return pd.Series(binned, index=values.index, name=values.name)
+        return pd.Series(binned)
+
+    @staticmethod
+    def bin_numeric_columns(df, columns=None, method='equal_width', bins=10, edges=None, max_levels=20):
+        # Числовые столбцы из columns (по умолчанию все) с числом различных значений
+        # больше max_levels заменяются интервалами, так что размер таблицы сопряженности
+        # ограничен числом интервалов. Для method='custom' edges - словарь
+        # {столбец: границы}: разбиваются только перечисленные в нем столбцы, каждый
+        # по своим границам и независимо от числа значений
+        columns = list(df.columns if columns is None else columns)
+        if method == 'custom':
+            if not isinstance(edges, dict):
+                raise ValueError("Свои границы интервалов задаются для каждого столбца отдельно")
+            columns = [col for col in columns if col in edges]
+        binned = df.copy(deep=False)
+        for col in columns:
+            column = df[col]
+            if not pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+                if method == 'custom':
+                    raise ValueError(f"Столбец {col} не числовой")
+                continue
+            if method == 'custom':
+                binned[col] = PracticeAnalysis.bin_column(column, method, edges=edges[col])
+            elif column.nunique() > max_levels:
+                binned[col] = PracticeAnalysis.bin_column(column, method, bins)
+        return binned
+
+    @staticmethod
+    def collapse_categories(table, max_rows=None, max_cols=None, other_label='Другие'):
+        # Оставляет limit - 1 самых частых строк (столбцов) в исходном порядке,
+        # остальные суммируются в одну категорию other_label; составные метки
+        # индекса склеиваются через ' | ', чтобы к ним можно было добавить other_label
+        result = table.copy()
+        for axis, limit in ((0, max_rows), (1, max_cols)):
+            labels = result.axes[axis]
+            if isinstance(labels, pd.MultiIndex):
+                labels = pd.Index([' | '.join(map(str, label)) for label in labels])
+            if limit is None or len(labels) <= limit:
+                result = result.set_axis(labels, axis=axis)
+                continue
+            values = result.to_numpy()
+            totals = values.sum(axis=1 - axis)
+            keep = np.zeros(len(labels), dtype=bool)
+            keep[np.argsort(-totals, kind='stable')[:limit - 1]] = True
+            kept = values.compress(keep, axis=axis)
+            other = values.compress(~keep, axis=axis).sum(axis=axis, keepdims=True)
+            new_labels = pd.Index(list(labels[keep]) + [other_label])
+            merged = np.concatenate([kept, other], axis=axis)
+            if axis == 0:
+                result = pd.DataFrame(merged, index=new_labels, columns=result.columns)
+            else:
+                result = pd.DataFrame(merged, index=result.index, columns=new_labels)
+        return result
+
+    @staticmethod
+    def create_contingency_table(df, columns, max_dense_cells=1_000_000, use_cache=False):
+        # Та же таблица, что и pd.crosstab, но по кодам категорий: сочетание столбцов
+        # кодируется одним целым числом и считается np.bincount. С use_cache=True коды
+        # запоминаются для df и переиспользуются при другом выборе столбцов; это
+        # допустимо, только если значения df не изменяются на месте после вызова
         if len(columns) < 2:
             raise ValueError("Необходимо выбрать минимум два столбца")
+        columns = list(columns)
         index_cols = columns[:-1]
         column_col = columns[-1]
-        return pd.crosstab(index=[df[c] for c in index_cols],
-                           columns=df[column_col])
+        if use_cache:
+            codes, levels = PracticeAnalysis._cached_codes(df, columns)
+        else:
+            codes, levels = PracticeAnalysis._factorize_columns(df, columns)
+        dims = [len(levels[c]) for c in columns]
+        if 0 in dims:
+            raise ValueError("В выбранных столбцах нет данных")
+        if math.prod(dims) <= max_dense_cells:
+            mask = np.all([codes[c] >= 0 for c in columns], axis=0)
+            keys = np.ravel_multi_index([codes[c][mask] for c in columns], dims)
+            counts = np.bincount(keys, minlength=math.prod(dims)).reshape(-1, dims[-1])
+            rows = np.flatnonzero(counts.any(axis=1))
+            cols = np.flatnonzero(counts.any(axis=0))
+            return pd.DataFrame(counts[rows][:, cols],
+                                index=PracticeAnalysis._row_index(rows, levels, index_cols),
+                                columns=pd.Index(levels[column_col][cols], name=column_col))
+        table = PracticeAnalysis._table_from_codes(codes, levels, columns)
+        if table.shape[0] * table.shape[1] <= max_dense_cells:
+            return table.to_frame()
+        # Плотная таблица не помещается в память: оставляем CSR по кодам категорий
+        return table
+
+    @staticmethod
+    def stream_contingency_table(file_path, columns, chunksize=100_000, progress=None,
+                                 max_dense_cells=1_000_000):
+        # Читает CSV по частям и только выбранные столбцы; в памяти хранятся лишь
+        # частоты наблюдаемых сочетаний. progress(доля) вызывается после каждой части.
+        # Тип каждой части определялся бы отдельно, и одно значение ("1" и 1) попало
+        # бы в разные категории, поэтому все столбцы читаются как строки: метки
+        # таблицы - строки в том виде, в каком записаны в файле
+        accumulator = ContingencyCounts(columns)
+        total_size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            for chunk in pd.read_csv(f, usecols=accumulator.columns, chunksize=chunksize,
+                                     dtype={col: str for col in accumulator.columns}):
+                accumulator.update(chunk)
+                if progress is not None:
+                    progress(min(f.tell() / total_size, 1.0) if total_size else 1.0)
+        return accumulator.to_table(max_dense_cells)
 
     @staticmethod
     def chi_square(table):
-        chi2, p, dof, expected = chi2_contingency(table)
-        return {'Хи-квадрат': chi2,
+        stats = PracticeAnalysis._table_stats(table)
+        result = {'Хи-квадрат': stats['chi2'],
+                  'p-значение': stats['p'],
+                  'Степени свободы': stats['dof']}
+        if stats['expected'] is not None:
+            result['Ожидаемые частоты'] = stats['expected']
+        return result
+
+    @staticmethod
+    def chi_square_monte_carlo(table, n_replicates=20000, seed=None, tolerance=0.005,
+                               confidence=0.99, batch_size=2000, max_batch_cells=2 ** 22, progress=None):
+        if n_replicates < 1:
+            return {'Ошибка': 'Число репликаций должно быть не меньше 1'}
+        stats = PracticeAnalysis._table_stats(table)
+        if stats['expected'] is None:
+            return {'Ошибка': 'Метод не поддерживает разреженные таблицы'}
+        observed = stats['observed'].astype(np.int64)
+        expected = stats['expected']
+        r, c = observed.shape
+        observed_chi2 = float(np.sum((observed - expected) ** 2 / expected))
+        # Развертываем таблицу в пары меток и перемешиваем метки столбцов:
+        # перестановка сохраняет обе маргинальные суммы
+        row_labels = np.repeat(np.arange(r), observed.sum(axis=1))
+        col_labels = np.concatenate([np.repeat(np.arange(c), observed[i]) for i in range(r)])
+        n = len(row_labels)
+        rng = np.random.default_rng(seed)
+        z = norm.ppf(0.5 + confidence / 2)
+        batch_size = max(1, min(batch_size, max_batch_cells // max(n, 1)))
+        exceed, done = 0, 0
+        threshold = observed_chi2 * (1 - 1e-7)
+        while done < n_replicates:
+            size = min(batch_size, n_replicates - done)
+            permuted = rng.permuted(np.broadcast_to(col_labels, (size, n)), axis=1)
+            keys = permuted + row_labels * c + (np.arange(size) * (r * c))[:, None]
+            tables = np.bincount(keys.ravel(), minlength=size * r * c).reshape(size, r, c)
+            simulated = np.sum((tables - expected) ** 2 / expected, axis=(1, 2))
+            exceed += int(np.count_nonzero(simulated >= threshold))
+            done += size
+            p = (exceed + 1) / (done + 1)
+            half_width = z * np.sqrt(p * (1 - p) / done)
+            if tolerance is not None and half_width <= tolerance:
+                if progress is not None:
+                    progress(1.0)
+                break
+            if progress is not None:
+                progress(done / n_replicates)
+        return {'Хи-квадрат': observed_chi2,
                 'p-значение': p,
-                'Степени свободы': dof,
-                'Ожидаемые частоты': expected}
+                'Число репликаций': done,
+                'Доверительный интервал p': (max(p - float(half_width), 0.0), min(p + float(half_width), 1.0))}
 
     @staticmethod
     def fishers_exact(table):
@@ -143,25 +847,611 @@ class PracticeAnalysis:
         return {'Отношение шансов': or_val, 'p-значение': p}
 
     @staticmethod
-    def cramers_v(table):
-        return {'Коэффициент Крамера V': PracticeAnalysis._cramers_v(table)}
+    def freeman_halton(table, max_nodes=2_000_000, max_arcs=20_000_000, progress=None):
+        # Точный тест Фримана-Холтона сетевым алгоритмом (Mehta & Patel):
+        # столбцы обрабатываются по одному, узел сети - отсортированные остатки
+        # строковых сумм. Сеть раскрывается по ходу обхода и только из узлов,
+        # куда перенесены пути; для потомков считаются границы весов завершений,
+        # по которым ребро сразу учитывается целиком или отбрасывается.
+        # max_arcs ограничивает число перенесенных путей (хранимых завершений -
+        # вдвое больше), max_nodes - число узлов с запомненными границами.
+        # progress(доля) вызывается по ходу обхода узлов
+        started = time.perf_counter()
+        if isinstance(table, SparseContingencyTable) or sparse.issparse(table):
+            return {'Ошибка': 'Метод не поддерживает разреженные таблицы'}
+        observed = np.asarray(table, dtype=np.int64)
+        if observed.ndim != 2 or observed.size == 0:
+            return {'Ошибка': 'Таблица сопряженности должна быть двумерной'}
+        if observed.shape[0] > observed.shape[1]:
+            observed = observed.T
+        row_sums = np.sort(observed.sum(axis=1))[::-1]
+        col_sums = np.sort(observed.sum(axis=0))[::-1]
+        if row_sums[-1] == 0 or col_sums[-1] == 0:
+            return {'Ошибка': 'Таблица содержит нулевые строки или столбцы'}
+        n = int(row_sums.sum())
+        n_rows, n_cols = observed.shape
+        if n_cols == 1:
+            return {'p-значение': 1.0, 'Исследовано узлов': 1,
+                    'Время вычисления, с': time.perf_counter() - started}
+        # Узел кодируется одним целым числом в системе счисления по основанию base
+        base = int(row_sums.max()) + 1
+        if base ** n_rows >= 2 ** 62:
+            return {'Ошибка': 'Таблица слишком велика для точного теста'}
+        radix = base ** np.arange(n_rows, dtype=np.int64)
+        lf = np.array([math.lgamma(k + 1) for k in range(n + 1)])
+        col_lf_suffix = np.concatenate([np.cumsum(lf[col_sums][::-1])[::-1], [0.0]])
+        log_k = lf[row_sums].sum() + col_lf_suffix[0] - lf[n]
+        # Вес таблицы -sum(log x!), вероятность = exp(log_k + вес)
+        observed_weight = -lf[observed.ravel()].sum()
+        threshold = observed_weight + 1e-7 * max(1.0, abs(observed_weight))
+        limit_error = {'Ошибка': f'Превышен лимит сети ({max_arcs} путей, {max_nodes} узлов); '
+                                 f'используйте метод «Хи-квадрат (Монте-Карло)»'}
+        # Ребра строятся пачками примерно по batch_arcs, чтобы память не зависела от лимитов
+        batch_arcs = 1_000_000
+
+        def column_fillings(caps, total):
+            # Все столбцы с суммой total, не превышающие остатки строк каждого узла
+            suffix = np.concatenate([np.cumsum(caps[:, ::-1], axis=1)[:, ::-1],
+                                     np.zeros((len(caps), 1), dtype=np.int64)], axis=1)
+            parent = np.arange(len(caps))
+            fillings = np.zeros((len(caps), 0), dtype=np.int64)
+            taken = np.zeros(len(caps), dtype=np.int64)
+            for i in range(n_rows - 1):
+                lo = np.maximum(0, total - taken - suffix[parent, i + 1])
+                hi = np.minimum(caps[parent, i], total - taken)
+                sizes = hi - lo + 1
+                step = np.repeat(np.arange(len(taken)), sizes)
+                x = lo[step] + np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+                if len(x) > max_arcs:
+                    raise OverflowError
+                fillings = np.column_stack([fillings[step], x])
+                parent, taken = parent[step], taken[step] + x
+            return np.column_stack([fillings, total - taken]), parent
+
+        def fillings_count(total):
+            # Оценка сверху числа столбцов с суммой total ("шары и перегородки")
+            return math.comb(int(total) + n_rows - 1, n_rows - 1)
+
+        def even_fill(totals, caps):
+            # max -sum(log x!) при sum x = total, 0 <= x <= caps: самое равномерное заполнение
+            caps = np.sort(caps, axis=1)
+            remaining = totals.astype(np.int64)
+            weight = np.zeros(len(caps))
+            for i in range(caps.shape[1]):
+                k = caps.shape[1] - i
+                binding = caps[:, i] <= remaining // k
+                quotient, rest = np.divmod(remaining, k)
+                spread = ~binding & (remaining >= 0)
+                weight -= np.where(binding, lf[np.where(binding, caps[:, i], 0)], 0.0)
+                weight -= np.where(spread, rest * lf[quotient + 1] + (k - rest) * lf[quotient], 0.0)
+                # после равномерного распределения остаток исчерпан
+                remaining = np.where(binding, remaining - caps[:, i], -1)
+            return weight
+
+        def greedy_fill(totals, caps):
+            # min -sum(log x!): заполняются сначала наибольшие ячейки
+            caps = -np.sort(-caps, axis=1)
+            remaining = totals.astype(np.int64)
+            weight = np.zeros(len(caps))
+            for i in range(caps.shape[1]):
+                x = np.minimum(caps[:, i], remaining)
+                weight -= lf[x]
+                remaining = remaining - x
+            return weight
+
+        def relaxed_bounds(nodes, stage):
+            # Границы весов завершений без ограничений строк (столбцы независимы)
+            # или без ограничений столбцов (строки независимы)
+            cols = col_sums[stage:]
+            col_caps = np.broadcast_to(cols, (len(nodes), len(cols)))
+            longest = np.minimum(sum(even_fill(np.full(len(nodes), c), nodes) for c in cols),
+                                 sum(even_fill(nodes[:, i], col_caps) for i in range(n_rows)))
+            shortest = np.maximum(sum(greedy_fill(np.full(len(nodes), c), nodes) for c in cols),
+                                  sum(greedy_fill(nodes[:, i], col_caps) for i in range(n_rows)))
+            return longest, shortest
+
+        # Для узлов с двумя оставшимися столбцами - веса всех завершений по
+        # возрастанию и накопленные суммы exp(вес - наибольший вес)
+        completion_lists = {}
+        completions_left = 2 * max_arcs
+
+        def completions(nodes, keys):
+            nonlocal completions_left
+            missing = [i for i, key in enumerate(keys.tolist()) if key not in completion_lists]
+            batch = max(1, batch_arcs // fillings_count(col_sums[-2]))
+            for start in range(0, len(missing), batch):
+                part = missing[start:start + batch]
+                caps = nodes[part]
+                fillings, parent = column_fillings(caps, col_sums[-2])
+                completions_left -= len(fillings)
+                if completions_left < 0:
+                    raise OverflowError
+                weights = -lf[fillings].sum(axis=1) - lf[caps[parent] - fillings].sum(axis=1)
+                order = np.lexsort((weights, parent))
+                weights, parent = weights[order], parent[order]
+                bounds = np.searchsorted(parent, np.arange(len(part) + 1))
+                for t, i in enumerate(part):
+                    ends = weights[bounds[t]:bounds[t + 1]]
+                    completion_lists[int(keys[i])] = (
+                        ends, np.concatenate([[0.0], np.cumsum(np.exp(ends - ends[-1]))]))
+            return [completion_lists[key] for key in keys.tolist()]
+
+        # Границы запоминаются по стадиям; пока хватает бюджета, граница узла
+        # уточняется раскрытием одного столбца: максимум (минимум) по ребрам
+        # веса ребра и границы потомка. Для двух последних столбцов границы точные
+        known_bounds = [dict() for _ in range(n_cols)]
+        refine_budget = 4 * max_arcs
+
+        def node_bounds(nodes, keys, stage):
+            nonlocal refine_budget
+            longest, shortest = np.empty(len(keys)), np.empty(len(keys))
+            missing = []
+            for i, key in enumerate(keys.tolist()):
+                known = known_bounds[stage].get(key)
+                if known is None:
+                    missing.append(i)
+                else:
+                    longest[i], shortest[i] = known
+            if not missing:
+                return longest, shortest
+            caps = nodes[missing]
+            if stage == n_cols - 1:
+                upper = lower = -lf[caps].sum(axis=1)
+            elif stage == n_cols - 2:
+                lists = completions(caps, keys[missing])
+                upper = np.array([ends[-1] for ends, _ in lists])
+                lower = np.array([ends[0] for ends, _ in lists])
+            else:
+                upper, lower = relaxed_bounds(caps, stage)
+                per_node = fillings_count(col_sums[stage])
+                if len(caps) * per_node <= refine_budget:
+                    refine_budget -= len(caps) * per_node
+                    batch = max(1, batch_arcs // per_node)
+                    for start in range(0, len(caps), batch):
+                        part = caps[start:start + batch]
+                        fillings, parent = column_fillings(part, col_sums[stage])
+                        residual = -np.sort(fillings - part[parent], axis=1)
+                        child_keys, first, child = np.unique(residual @ radix, return_index=True, return_inverse=True)
+                        child_upper, child_lower = node_bounds(residual[first], child_keys, stage + 1)
+                        weights = -lf[fillings].sum(axis=1)
+                        starts = np.searchsorted(parent, np.arange(len(part)))
+                        upper[start:start + batch] = np.minimum(
+                            upper[start:start + batch], np.maximum.reduceat(weights + child_upper[child.ravel()], starts))
+                        lower[start:start + batch] = np.maximum(
+                            lower[start:start + batch], np.minimum.reduceat(weights + child_lower[child.ravel()], starts))
+            for i, key, up, low in zip(missing, keys[missing].tolist(), upper, lower):
+                known_bounds[stage][key] = (up, low)
+                longest[i], shortest[i] = up, low
+            if sum(len(known) for known in known_bounds) > max_nodes:
+                raise OverflowError
+            return longest, shortest
+
+        p_value = 0.0
+        nodes = 1
+        stage_nodes = row_sums[None, :]
+        path_nodes = np.zeros(1, dtype=np.int64)
+        path_values, path_counts = np.zeros(1), np.ones(1)
+        try:
+            for j in range(n_cols - 1):
+                lookahead = j == n_cols - 3
+                # Объединяем пути с одинаковым весом в каждом узле и сортируем их по весу
+                rounded = np.round(path_values, 9)
+                order = np.lexsort((rounded, path_nodes))
+                path_nodes, rounded = path_nodes[order], rounded[order]
+                distinct = np.concatenate([[True], (path_nodes[1:] != path_nodes[:-1]) | (rounded[1:] != rounded[:-1])])
+                merged_counts = np.bincount(np.cumsum(distinct) - 1, weights=path_counts[order])
+                merged_values = path_values[order][distinct]
+                merged_nodes = path_nodes[distinct]
+                segments = np.searchsorted(merged_nodes, np.arange(len(stage_nodes) + 1))
+                active = np.unique(merged_nodes)
+                next_keys, next_values, next_counts = [], [], []
+                carried_paths = 0
+                carried_nodes = {}
+                batch = max(1, batch_arcs // fillings_count(col_sums[j]))
+                for start in range(0, len(active), batch):
+                    if progress is not None:
+                        progress((j + start / len(active)) / (n_cols - 1))
+                    group = active[start:start + batch]
+                    fillings, parent = column_fillings(stage_nodes[group], col_sums[j])
+                    residual = -np.sort(fillings - stage_nodes[group][parent], axis=1)
+                    child_keys, first, child = np.unique(residual @ radix, return_index=True, return_inverse=True)
+                    child = child.ravel()
+                    children_nodes = residual[first]
+                    longest, shortest = node_bounds(children_nodes, child_keys, j + 1)
+                    log_totals = (lf[children_nodes.sum(axis=1)] - lf[children_nodes].sum(axis=1)
+                                  - col_lf_suffix[j + 1])
+                    if lookahead:
+                        lists = completions(children_nodes, child_keys)
+                        ends_all = np.concatenate([ends for ends, _ in lists])
+                        ends_start = np.concatenate([[0], np.cumsum([len(ends) for ends, _ in lists])])
+                        cumulative_all = np.concatenate([cumulative for _, cumulative in lists])
+                        ends_top = np.array([ends[-1] for ends, _ in lists])
+                        pending, pending_size = [], 0
+                    received = np.zeros(len(child_keys), dtype=bool)
+                    weights = -lf[fillings].sum(axis=1)
+                    starts = np.searchsorted(parent, np.arange(len(group) + 1))
+                    for k, node in enumerate(group):
+                        values = merged_values[segments[node]:segments[node + 1]]
+                        counts = merged_counts[segments[node]:segments[node + 1]]
+                        scale = values[-1]
+                        cumulative = np.concatenate([[0.0], np.cumsum(counts * np.exp(values - scale))])
+                        children = child[starts[k]:starts[k + 1]]
+                        step = weights[starts[k]:starts[k + 1]]
+                        # Пути, все завершения которых не вероятнее наблюдаемой таблицы,
+                        # учитываются сразу через накопленные суммы; пути без таких
+                        # завершений отбрасываются; остальные переходят в следующий узел
+                        lo = np.searchsorted(values, threshold - longest[children] - step, side='right')
+                        hi = np.searchsorted(values, threshold - shortest[children] - step, side='right')
+                        p_value += float(np.sum(cumulative[lo] * np.exp(
+                            log_totals[children] + log_k + scale + step)))
+                        carried = np.flatnonzero(hi > lo)
+                        if not len(carried):
+                            continue
+                        children, step, lo, hi = children[carried], step[carried], lo[carried], hi[carried]
+                        sizes = hi - lo
+                        if lookahead:
+                            # Перед последними двумя столбцами пути не переносятся. Если
+                            # завершений потомка намного меньше путей, каждое завершение
+                            # сравнивается с накопленными суммами узла
+                            lengths = ends_start[children + 1] - ends_start[children]
+                            short = lengths < 8 * sizes
+                            if short.any():
+                                lengths, short_lo = lengths[short], lo[short]
+                                pair = np.repeat(np.arange(len(lengths)), lengths)
+                                ends = ends_all[np.repeat(ends_start[children[short]], lengths) + np.arange(lengths.sum())
+                                                - np.repeat(np.cumsum(lengths) - lengths, lengths)]
+                                idx = np.clip(np.searchsorted(values, threshold - step[short][pair] - ends, side='right'),
+                                              short_lo[pair], hi[short][pair])
+                                p_value += float(np.sum((cumulative[idx] - cumulative[short_lo[pair]])
+                                                        * np.exp(log_k + scale + step[short][pair] + ends)))
+                                children, step, lo, sizes = children[~short], step[~short], lo[~short], sizes[~short]
+                        total = int(sizes.sum())
+                        if not total:
+                            continue
+                        picked = np.repeat(lo, sizes) + np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+                        if lookahead:
+                            # иначе пути копятся и сравниваются с завершениями потомков пачкой
+                            pending.append((np.repeat(children, sizes), values[picked] + np.repeat(step, sizes),
+                                            counts[picked]))
+                            pending_size += total
+                            if pending_size > 4 * batch_arcs:
+                                p_value += PracticeAnalysis._completion_mass(
+                                    pending, ends_all, ends_start, cumulative_all, ends_top, threshold, log_k)
+                                pending, pending_size = [], 0
+                            continue
+                        received[children] = True
+                        next_keys.append(child_keys[np.repeat(children, sizes)])
+                        next_values.append(values[picked] + np.repeat(step, sizes))
+                        next_counts.append(counts[picked])
+                        carried_paths += total
+                        if carried_paths > max_arcs:
+                            return limit_error
+                    for key, vector in zip(child_keys[received].tolist(), children_nodes[received]):
+                        carried_nodes[key] = vector
+                    if lookahead and pending:
+                        p_value += PracticeAnalysis._completion_mass(
+                            pending, ends_all, ends_start, cumulative_all, ends_top, threshold, log_k)
+                if not next_keys:
+                    break
+                path_keys = np.concatenate(next_keys)
+                unique_keys, path_nodes = np.unique(path_keys, return_inverse=True)
+                path_nodes = path_nodes.ravel()
+                stage_nodes = np.array([carried_nodes[key] for key in unique_keys.tolist()])
+                path_values = np.concatenate(next_values)
+                path_counts = np.concatenate(next_counts)
+                nodes += len(unique_keys)
+        except (OverflowError, MemoryError):
+            return limit_error
+        if progress is not None:
+            progress(1.0)
+        return {'p-значение': min(p_value, 1.0),
+                'Исследовано узлов': nodes + sum(len(known) for known in known_bounds),
+                'Время вычисления, с': time.perf_counter() - started}
+
+    @staticmethod
+    def _completion_mass(pending, ends_all, ends_start, cumulative_all, ends_top, threshold, log_k):
+        # Вклад путей, пришедших в узлы с двумя оставшимися столбцами: пути с
+        # одинаковым весом объединяются, затем для каждого пути двоичным поиском
+        # по завершениям его узла берется масса завершений не вероятнее наблюдаемой
+        children = np.concatenate([p[0] for p in pending])
+        values = np.concatenate([p[1] for p in pending])
+        counts = np.concatenate([p[2] for p in pending])
+        rounded = np.round(values, 9)
+        order = np.lexsort((rounded, children))
+        children, values, rounded = children[order], values[order], rounded[order]
+        distinct = np.concatenate([[True], (children[1:] != children[:-1]) | (rounded[1:] != rounded[:-1])])
+        counts = np.bincount(np.cumsum(distinct) - 1, weights=counts[order])
+        children, values = children[distinct], values[distinct]
+        lo, hi = ends_start[children], ends_start[children + 1]
+        target = threshold - values
+        while True:
+            open_ = lo < hi
+            if not open_.any():
+                break
+            mid = (lo + hi) // 2
+            below = open_ & (ends_all[np.minimum(mid, len(ends_all) - 1)] <= target)
+            lo = np.where(below, mid + 1, lo)
+            hi = np.where(open_ & ~below, mid, hi)
+        # накопленные суммы узла длиннее списка весов на один ведущий ноль
+        mass = cumulative_all[lo + children]
+        return float(np.sum(counts * np.exp(log_k + values + ends_top[children]) * mass))
+
+    @staticmethod
+    def _batch_measure(tables, measure):
+        # Мера связи сразу для стопки таблиц (B x r x c)
+        tables = np.asarray(tables, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if measure == 'cramers_v':
+                n = tables.sum(axis=(1, 2))
+                expected = tables.sum(axis=2)[:, :, None] * tables.sum(axis=1)[:, None, :] / n[:, None, None]
+                diff = np.abs(expected - tables)
+                if tables.shape[1:] == (2, 2):
+                    # Поправка Йейтса, как в _table_stats
+                    diff = np.maximum(diff - 0.5, 0.0)
+                chi2 = np.where(expected > 0, diff ** 2 / expected, 0.0).sum(axis=(1, 2))
+                return np.sqrt(chi2 / n / min(tables.shape[1] - 1, tables.shape[2] - 1))
+            a, b = tables[:, 0, 0], tables[:, 0, 1]
+            c, d = tables[:, 1, 0], tables[:, 1, 1]
+            if measure == 'phi':
+                return (a * d - b * c) / np.sqrt((a + b) * (c + d) * (a + c) * (b + d))
+            return (a * d) / (b * c)
+
+    @staticmethod
+    def _bootstrap_interval(table, measure, label, n_replicates=10000, confidence=0.95, seed=None,
+                            batch_size=2000, progress=None):
+        # Репликации - мультиномиальные выборки с вероятностями наблюдаемых ячеек,
+        # одна выборка формы (репликации x ячейки) на пакет
+        if isinstance(table, SparseContingencyTable) or sparse.issparse(table):
+            raise ValueError("Бутстреп не поддерживает разреженные таблицы")
+        observed = np.asarray(table, dtype=float)
+        counts = observed.ravel()
+        n = int(counts.sum())
+        estimate = PracticeAnalysis._batch_measure(observed[None], measure)[0]
+        rng = np.random.default_rng(seed)
+        replicates = []
+        for start in range(0, n_replicates, batch_size):
+            size = min(batch_size, n_replicates - start)
+            draws = rng.multinomial(n, counts / n, size=size).reshape(size, *observed.shape)
+            replicates.append(PracticeAnalysis._batch_measure(draws, measure))
+            if progress is not None:
+                progress((start + size) / n_replicates)
+        boot = np.concatenate(replicates)
+        boot = boot[~np.isnan(boot)]
+        alpha = (1 - confidence) / 2
+        percentile = np.quantile(boot, [alpha, 1 - alpha], method='inverted_cdf')
+        bca = percentile
+        if np.isfinite(estimate):
+            # BCa: поправка на смещение по доле репликаций ниже оценки и ускорение
+            # по методу складного ножа (удаление одного наблюдения из каждой ячейки)
+            share = np.clip(np.mean(boot < estimate), 1 / (len(boot) + 1), len(boot) / (len(boot) + 1))
+            z0 = norm.ppf(share)
+            cells = np.flatnonzero(counts)
+            jack = np.repeat(counts[None], len(cells), axis=0)
+            jack[np.arange(len(cells)), cells] -= 1
+            values = PracticeAnalysis._batch_measure(jack.reshape(-1, *observed.shape), measure)
+            weights = counts[cells]
+            finite = np.isfinite(values)
+            acceleration = 0.0
+            if finite.any():
+                deviation = np.average(values[finite], weights=weights[finite]) - values[finite]
+                spread = np.sum(weights[finite] * deviation ** 2)
+                if spread > 0:
+                    acceleration = np.sum(weights[finite] * deviation ** 3) / (6 * spread ** 1.5)
+            z = norm.ppf([alpha, 1 - alpha])
+            levels = norm.cdf(z0 + (z0 + z) / (1 - acceleration * (z0 + z)))
+            bca = np.quantile(boot, levels, method='inverted_cdf')
+        level = f'{confidence:.0%}'
+        return {f'{label}, {level} ДИ (перцентильный)': (float(percentile[0]), float(percentile[1])),
+                f'{label}, {level} ДИ (BCa)': (float(bca[0]), float(bca[1])),
+                'Число бутстреп-репликаций': len(boot)}
+
+    @staticmethod
+    def cramers_v(table, n_bootstrap=0, confidence=0.95, seed=None, progress=None):
+        result = {'Коэффициент Крамера V': PracticeAnalysis._cramers_v(table)}
+        if n_bootstrap:
+            result.update(PracticeAnalysis._bootstrap_interval(table, 'cramers_v', 'Коэффициент Крамера V',
+                                                               n_bootstrap, confidence, seed, progress=progress))
+        return result
 
     @staticmethod
     def contingency_coefficient(table):
         return {'Коэффициент сопряженности': PracticeAnalysis._contingency_coefficient(table)}
 
     @staticmethod
-    def phi_coefficient(table):
+    def phi_coefficient(table, n_bootstrap=0, confidence=0.95, seed=None, progress=None):
         if table.shape != (2, 2):
             return {'Ошибка': 'Метод применим только к таблицам 2x2'}
-        return {'Коэффициент Фи': PracticeAnalysis._phi_coefficient(table)}
+        result = {'Коэффициент Фи': PracticeAnalysis._phi_coefficient(table)}
+        if n_bootstrap:
+            result.update(PracticeAnalysis._bootstrap_interval(table, 'phi', 'Коэффициент Фи',
+                                                               n_bootstrap, confidence, seed, progress=progress))
+        return result
 
     @staticmethod
-    def odds_ratio(table):
+    def odds_ratio(table, n_bootstrap=0, confidence=0.95, seed=None, progress=None):
         if table.shape != (2, 2):
             return {'Ошибка': 'Метод применим только к таблицам 2x2'}
-        return {'Отношение шансов': PracticeAnalysis._odds_ratio(table)}
+        result = {'Отношение шансов': PracticeAnalysis._odds_ratio(table)}
+        if n_bootstrap:
+            result.update(PracticeAnalysis._bootstrap_interval(table, 'odds_ratio', 'Отношение шансов',
+                                                               n_bootstrap, confidence, seed, progress=progress))
+        return result
+
+    @staticmethod
+    def bootstrap_measures(table, n_bootstrap=10000, confidence=0.95, seed=None, progress=None):
+        # Меры связи с бутстреп-интервалами; Фи и отношение шансов - для таблиц 2x2
+        parts = 3 if table.shape == (2, 2) else 1
+
+        def part_progress(k):
+            if progress is None:
+                return None
+            return lambda share: progress((k + share) / parts)
+
+        try:
+            result = PracticeAnalysis.cramers_v(table, n_bootstrap, confidence, seed, progress=part_progress(0))
+            if table.shape == (2, 2):
+                result.update(PracticeAnalysis.phi_coefficient(table, n_bootstrap, confidence, seed,
+                                                               progress=part_progress(1)))
+                result.update(PracticeAnalysis.odds_ratio(table, n_bootstrap, confidence, seed,
+                                                          progress=part_progress(2)))
+        except ValueError as e:
+            return {'Ошибка': str(e)}
+        return result
 
     @staticmethod
     def goodman_kruskal_tau(table):
         return {'Тау-коэффициент': PracticeAnalysis._goodman_kruskal_tau(table)}
+
+    @staticmethod
+    def _stratified_tables(table):
+        # Стопка таблиц страт (K x r x c): страты - все уровни индекса, кроме последнего
+        if isinstance(table, np.ndarray) and table.ndim == 3:
+            return table.astype(float)
+        if isinstance(table, SparseContingencyTable):
+            cells = table.counts.tocoo()
+            rows, cols, values = cells.row, cells.col, cells.data
+        else:
+            values = np.asarray(table, dtype=float)
+            rows, cols = np.nonzero(values)
+            values = values[rows, cols]
+        index = table.index
+        if not isinstance(index, pd.MultiIndex):
+            raise ValueError("Для стратифицированного анализа выберите минимум три столбца")
+        codes = [np.asarray(index.codes[i])[rows] for i in range(index.nlevels)]
+        strata, stratum_codes = np.unique(np.ravel_multi_index(codes[:-1], [len(l) for l in index.levels[:-1]]),
+                                          return_inverse=True)
+        row_keys, row_codes = np.unique(codes[-1], return_inverse=True)
+        col_keys, col_codes = np.unique(cols, return_inverse=True)
+        tables = np.zeros((len(strata), len(row_keys), len(col_keys)))
+        np.add.at(tables, (stratum_codes.ravel(), row_codes.ravel(), col_codes.ravel()), values)
+        return tables
+
+    @staticmethod
+    def cochran_mantel_haenszel(table, max_dof=1000):
+        try:
+            tables = PracticeAnalysis._stratified_tables(table)
+        except ValueError as e:
+            return {'Ошибка': str(e)}
+        _, r, c = tables.shape
+        if r < 2 or c < 2:
+            return {'Ошибка': 'Таблицы страт должны иметь минимум две строки и два столбца'}
+        # Ковариационная матрица статистики - плотная, размером dof x dof
+        dof = (r - 1) * (c - 1)
+        if dof > max_dof:
+            return {'Ошибка': f'Слишком много категорий: число степеней свободы {dof} превышает {max_dof}'}
+        n = tables.sum(axis=(1, 2))
+        # Страты из одного наблюдения не несут информации о связи
+        tables = tables[n > 1]
+        n = n[n > 1]
+        if not len(n):
+            return {'Ошибка': 'Нет страт с двумя и более наблюдениями'}
+        row_p = tables.sum(axis=2) / n[:, None]
+        col_p = tables.sum(axis=1) / n[:, None]
+        # Обобщенная статистика CMH по (r-1)(c-1) независимым ячейкам всех страт сразу
+        diff = (tables - n[:, None, None] * row_p[:, :, None] * col_p[:, None, :])[:, :-1, :-1].sum(axis=0)
+        row_cov = (row_p[:, :, None] * np.eye(r) - row_p[:, :, None] * row_p[:, None, :])[:, :-1, :-1]
+        col_cov = (col_p[:, :, None] * np.eye(c) - col_p[:, :, None] * col_p[:, None, :])[:, :-1, :-1]
+        cov = np.einsum('k,kij,kab->iajb', n ** 2 / (n - 1), row_cov, col_cov).reshape(dof, dof)
+        diff = diff.ravel()
+        try:
+            cmh = float(diff @ np.linalg.solve(cov, diff))
+        except np.linalg.LinAlgError:
+            return {'Ошибка': 'Вырожденная ковариационная матрица статистики CMH'}
+        result = {'Статистика CMH': cmh,
+                  'p-значение': float(chi2_dist.sf(cmh, dof)),
+                  'Степени свободы': dof,
+                  'Число страт': len(n)}
+        if (r, c) == (2, 2):
+            a, b = tables[:, 0, 0], tables[:, 0, 1]
+            c_, d = tables[:, 1, 0], tables[:, 1, 1]
+            odds = np.sum(a * d / n) / np.sum(b * c_ / n)
+            result['Общее отношение шансов (Мантель-Хензель)'] = float(odds)
+            # Бреслоу-Дэй: ожидаемое a при общем OR - корень квадратного уравнения
+            m1, n1 = a + b, a + c_
+            lo, hi = np.maximum(0, m1 + n1 - n), np.minimum(m1, n1)
+            qa = 1 - odds
+            qb = n - m1 - n1 + odds * (m1 + n1)
+            qc = -odds * m1 * n1
+            with np.errstate(divide='ignore', invalid='ignore'):
+                root = np.sqrt(qb ** 2 - 4 * qa * qc)
+                fitted = np.where(np.abs(qa) < 1e-12, -qc / qb, (-qb + root) / (2 * qa))
+                fitted = np.where((fitted >= lo) & (fitted <= hi), fitted, (-qb - root) / (2 * qa))
+                var = 1 / (1 / fitted + 1 / (m1 - fitted) + 1 / (n1 - fitted) + 1 / (n - m1 - n1 + fitted))
+                terms = (a - fitted) ** 2 / var
+            informative = np.isfinite(terms) & (hi > lo)
+            breslow_day = float(np.sum(terms[informative]))
+            result['Статистика Бреслоу-Дэя'] = breslow_day
+            result['p-значение (Бреслоу-Дэй)'] = float(chi2_dist.sf(breslow_day, max(int(informative.sum()) - 1, 1)))
+        return result
+
+    @staticmethod
+    def all_measures(table):
+        stats = PracticeAnalysis._table_stats(table)
+        result = {'Хи-квадрат': stats['chi2'],
+                  'p-значение': stats['p'],
+                  'Степени свободы': stats['dof'],
+                  'Коэффициент Крамера V': PracticeAnalysis._cramers_v(table, stats),
+                  'Коэффициент сопряженности': PracticeAnalysis._contingency_coefficient(table, stats)}
+        if stats['observed'].shape == (2, 2):
+            result['Коэффициент Фи'] = PracticeAnalysis._phi_coefficient(stats['observed'])
+            result['Отношение шансов'] = PracticeAnalysis._odds_ratio(stats['observed'])
+        result['Тау-коэффициент'] = PracticeAnalysis._goodman_kruskal_tau(table, stats)
+        return result
+
+    @staticmethod
+    def screen_associations(df, columns=None, max_levels=50, max_workers=None, chunk_size=64):
+        if columns is None:
+            columns = PracticeAnalysis._categorical_columns(df, max_levels)
+        codes, levels = PracticeAnalysis._factorize_columns(df, columns)
+        n_levels = [len(levels[c]) for c in columns]
+        pairs = [(i, j) for i in range(len(columns)) for j in range(i + 1, len(columns))]
+        if not pairs:
+            return
+        stacked = np.stack([codes[c] for c in columns]).astype(np.int32)
+        shm = shared_memory.SharedMemory(create=True, size=max(stacked.nbytes, 1))
+        try:
+            np.ndarray(stacked.shape, dtype=np.int32, buffer=shm.buf)[:] = stacked
+            del stacked
+            max_workers = max_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_screen_pairs_worker, shm.name, (len(columns), len(df)),
+                                           n_levels, pairs[k:k + chunk_size])
+                           for k in range(0, len(pairs), chunk_size)]
+                try:
+                    for future in as_completed(futures):
+                        for i, j, result in future.result():
+                            yield columns[i], columns[j], result
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def association_matrix(df, columns=None, max_levels=50, max_workers=None):
+        if columns is None:
+            columns = PracticeAnalysis._categorical_columns(df, max_levels)
+        p_values = pd.DataFrame(np.nan, index=columns, columns=columns)
+        cramers = pd.DataFrame(np.nan, index=columns, columns=columns)
+        for i in range(len(columns)):
+            p_values.iat[i, i] = 0.0
+            cramers.iat[i, i] = 1.0
+        if max_workers is not None and max_workers > 1:
+            for a, b, result in PracticeAnalysis.screen_associations(df, columns, max_workers=max_workers):
+                if result is not None:
+                    p_values.loc[a, b] = p_values.loc[b, a] = result['p-значение']
+                    cramers.loc[a, b] = cramers.loc[b, a] = result['Коэффициент Крамера V']
+            return {'p-значения': p_values, 'Коэффициент Крамера V': cramers}
+        codes, levels = PracticeAnalysis._factorize_columns(df, columns)
+        for i, a in enumerate(columns):
+            for j in range(i + 1, len(columns)):
+                b = columns[j]
+                table = PracticeAnalysis._pair_table(codes[a], len(levels[a]), codes[b], len(levels[b]))
+                if min(table.shape) < 2:
+                    continue
+                stats = PracticeAnalysis._table_stats(table)
+                v = PracticeAnalysis._cramers_v(table, stats)
+                p_values.iat[i, j] = p_values.iat[j, i] = stats['p']
+                cramers.iat[i, j] = cramers.iat[j, i] = v
+        return {'p-значения': p_values, 'Коэффициент Крамера V': cramers}
@@ -0,0 +1,198 @@
+"""Пакетный анализ таблиц сопряженности без графического интерфейса.
+
+Пример:
+    python batch.py data/*.csv -c пол,курение -c возраст,давление -m chi_square,cramers_v -o results.csv
+    python batch.py data/ --all-pairs -m all_measures -o results.json --jobs 8
+    python batch.py data/*.csv -c возраст,курение --bin-method custom --edges возраст=0,18,35,60 -o results.csv
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from analysis import DatasetCache, PracticeAnalysis
+
+METHODS = {
+    'chi_square': PracticeAnalysis.chi_square,
+    'chi_square_monte_carlo': PracticeAnalysis.chi_square_monte_carlo,
+    'fishers_exact': PracticeAnalysis.fishers_exact,
+    'freeman_halton': PracticeAnalysis.freeman_halton,
+    'cramers_v': PracticeAnalysis.cramers_v,
+    'contingency_coefficient': PracticeAnalysis.contingency_coefficient,
+    'phi_coefficient': PracticeAnalysis.phi_coefficient,
+    'odds_ratio': PracticeAnalysis.odds_ratio,
+    'goodman_kruskal_tau': PracticeAnalysis.goodman_kruskal_tau,
+    'cochran_mantel_haenszel': PracticeAnalysis.cochran_mantel_haenszel,
+    'all_measures': PracticeAnalysis.all_measures,
+    'bootstrap_measures': PracticeAnalysis.bootstrap_measures,
+}
+
+
+def find_files(patterns):
+    # Каталог заменяется всеми CSV-файлами в нем, остальное раскрывается как glob
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.csv'))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        files.extend(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(set(files))
+
+
+def _plain(value):
+    # Результаты методов содержат типы NumPy; приводим их к типам JSON
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (np.ndarray, tuple, list)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def analyse_file(path, column_sets, methods, binning, cache_dir=None):
+    # Выполняется в отдельном процессе: загрузка файла и все методы для всех наборов столбцов
+    started = time.perf_counter()
+    records = []
+    try:
+        cache = DatasetCache(cache_dir) if cache_dir else None
+        df, _, _ = PracticeAnalysis.optimize_dtypes(PracticeAnalysis.load_data(path, cache=cache))
+        if binning['method'] != 'none':
+            # Разбиваются только анализируемые столбцы; при --all-pairs - все числовые
+            binned_columns = None if column_sets is None else sorted(
+                {col for columns in column_sets for col in columns if col in df.columns})
+            df = PracticeAnalysis.bin_numeric_columns(df, binned_columns, **binning)
+    except Exception as e:
+        return [{'file': path, 'columns': None, 'method': None, 'result': None,
+                 'error': f'Ошибка загрузки: {e}'}]
+    if column_sets is None:
+        column_sets = [list(pair) for pair in itertools.combinations(PracticeAnalysis._categorical_columns(df), 2)]
+    for columns in column_sets:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            records.append({'file': path, 'columns': columns, 'method': None, 'result': None,
+                            'error': f'Нет столбцов: {", ".join(missing)}'})
+            continue
+        try:
+            # Загруженный набор не изменяется, поэтому коды категорий кэшируются для всех наборов столбцов
+            table = PracticeAnalysis.create_contingency_table(df, columns, use_cache=True)
+        except Exception as e:
+            records.append({'file': path, 'columns': columns, 'method': None, 'result': None,
+                            'error': f'Ошибка построения таблицы: {e}'})
+            continue
+        for name in methods:
+            try:
+                result = METHODS[name](table)
+                error = result.pop('Ошибка', None) if isinstance(result, dict) else None
+            except Exception as e:
+                result, error = None, str(e)
+            records.append({'file': path, 'columns': columns, 'method': name,
+                            'result': _plain(result) or None, 'error': error})
+    for record in records:
+        record['seconds'] = time.perf_counter() - started
+    return records
+
+
+def write_results(records, output, fmt):
+    if fmt == 'json':
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        return
+    # CSV в длинном формате: одна строка на показатель, составные значения - в JSON
+    rows = []
+    for record in records:
+        base = {'file': record['file'], 'columns': ','.join(record['columns'] or []),
+                'method': record['method'], 'error': record['error']}
+        for key, value in (record['result'] or {None: None}).items():
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, ensure_ascii=False)
+            rows.append({**base, 'statistic': key, 'value': value})
+    pd.DataFrame(rows, columns=['file', 'columns', 'method', 'statistic', 'value', 'error']).to_csv(
+        output, index=False, encoding='utf-8')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ таблиц сопряженности для набора CSV-файлов")
+    parser.add_argument('inputs', nargs='+', help="CSV-файлы, каталоги или шаблоны glob")
+    parser.add_argument('-c', '--columns', action='append', default=[],
+                        help="Столбцы таблицы через запятую; параметр можно повторять")
+    parser.add_argument('--all-pairs', action='store_true',
+                        help="Анализировать все пары категориальных столбцов каждого файла")
+    parser.add_argument('-m', '--methods', default='all_measures',
+                        help=f"Методы через запятую: {', '.join(METHODS)}")
+    parser.add_argument('-o', '--output', required=True, help="Файл результатов (.csv или .json)")
+    parser.add_argument('--format', choices=['csv', 'json'], help="Формат результатов; по умолчанию по расширению")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Число процессов")
+    parser.add_argument('--bin-method', choices=['none', 'equal_width', 'quantile', 'custom'], default='none',
+                        help="Разбиение числовых столбцов на интервалы; по умолчанию без разбиения")
+    parser.add_argument('--bins', type=int, default=10, help="Число интервалов")
+    parser.add_argument('--edges', action='append', default=[],
+                        help="Свои границы интервалов столбца: столбец=0,18,35,60 (для --bin-method custom); "
+                             "параметр можно повторять")
+    parser.add_argument('--cache-dir', help="Каталог кэша разобранных наборов данных")
+    args = parser.parse_args(argv)
+    if not args.columns and not args.all_pairs:
+        parser.error("Укажите столбцы (-c) или --all-pairs")
+    args.column_sets = None if args.all_pairs else [[c.strip() for c in spec.split(',') if c.strip()]
+                                                    for spec in args.columns]
+    if args.column_sets and any(len(columns) < 2 for columns in args.column_sets):
+        parser.error("В каждом наборе столбцов должно быть минимум 2 столбца")
+    args.method_names = [m.strip() for m in args.methods.split(',') if m.strip()]
+    unknown = [m for m in args.method_names if m not in METHODS]
+    if unknown:
+        parser.error(f"Неизвестные методы: {', '.join(unknown)}")
+    edges = {}
+    for spec in args.edges:
+        column, sep, values = spec.rpartition('=')
+        if not sep or not column.strip():
+            parser.error(f"Границы задаются как столбец=0,18,35,60: {spec}")
+        try:
+            edges[column.strip()] = [float(x) for x in values.split(',') if x.strip()]
+        except ValueError:
+            parser.error("Границы интервалов должны быть числами через запятую")
+    args.edges = edges or None
+    if args.bin_method == 'custom' and not args.edges:
+        parser.error("Для --bin-method custom нужны --edges")
+    args.format = args.format or ('json' if args.output.lower().endswith('.json') else 'csv')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = find_files(args.inputs)
+    if not files:
+        print("Не найдено ни одного CSV-файла", file=sys.stderr)
+        return 2
+    binning = {'method': args.bin_method, 'bins': args.bins, 'edges': args.edges}
+    records = []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(files)))) as executor:
+        futures = {executor.submit(analyse_file, path, args.column_sets, args.method_names, binning, args.cache_dir): path
+                   for path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                file_records = future.result()
+            except Exception as e:
+                file_records = [{'file': path, 'columns': None, 'method': None, 'result': None,
+                                 'error': f'Сбой обработки: {e}', 'seconds': None}]
+            records.extend(file_records)
+            failed = sum(record['error'] is not None for record in file_records)
+            print(f"[{done}/{len(files)}] {path}: {len(file_records)} результатов, ошибок: {failed}", file=sys.stderr)
+    records.sort(key=lambda record: (record['file'], record['columns'] or [], record['method'] or ''))
+    write_results(records, args.output, args.format)
+    print(f"Результаты записаны в {args.output}", file=sys.stderr)
+    return 1 if any(record['method'] is None for record in records) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,36 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
-import sqlite3
-import uuid
+from typing import List, Optional
+import asyncio
+import base64
+import binascii
+import functools
 import hashlib
+import json
+import sqlite3
+
+from storage import Database, RESULT_SORTS
 
 app = FastAPI()
 
-conn = sqlite3.connect('test_results.db', check_same_thread=False)
-cursor = conn.cursor()
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id TEXT PRIMARY KEY,
-        username TEXT UNIQUE,
-        password_hash TEXT,
-        role TEXT
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS test_results (
-        id TEXT PRIMARY KEY,
-        user_name TEXT,
-        test_name TEXT,
-        score REAL,
-        date TEXT
-    )
-''')
-conn.commit()
+DB_POOL_SIZE = 8
+# Результаты тестов накапливаются до RESULT_BATCH_DELAY секунд и фиксируются одной транзакцией
+RESULT_BATCH_DELAY = 0.005
+RESULT_MAX_BATCH = 500
+# Размер страницы GET /results по умолчанию и наибольший; выгрузка NDJSON читает базу такими же страницами
+RESULTS_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 1000
+
+# Соединения берутся из пула на время каждого запроса к базе
+db = Database('test_results.db', pool_size=DB_POOL_SIZE, batch_delay=RESULT_BATCH_DELAY,
+              max_batch=RESULT_MAX_BATCH)
+# Вызовы SQLite блокируют поток, поэтому выполняются в пулах потоков, а не в цикле
+# событий. SQLite допускает одного писателя, и запись идет в одном потоке: ожидание
+# блокировки записи не занимает потоки чтения, которым в режиме WAL она не мешает
+db_readers = ThreadPoolExecutor(max_workers=DB_POOL_SIZE - 1, thread_name_prefix='db-read')
+db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+
+
+async def run_db(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(db_readers, functools.partial(fn, *args))
+
+
+async def run_db_write(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(db_writer, functools.partial(fn, *args))
+
+
+@app.on_event("shutdown")
+def close_database():
+    db_readers.shutdown(wait=True)
+    db_writer.shutdown(wait=True)
+    db.close()
 
 class UserCreate(BaseModel):
     username: str
@@ -47,17 +64,10 @@ def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 def create_user(username: str, password: str, role: str):
-    user_id = str(uuid.uuid4())
-    password_hash = hash_password(password)
-    cursor.execute('INSERT INTO users (id, username, password_hash, role) VALUES (?, ?, ?, ?)',
-                   (user_id, username, password_hash, role))
-    conn.commit()
-    return user_id
+    return db.create_user(username, hash_password(password), role)
 
 def get_user_by_username(username: str):
-    cursor.execute('SELECT id, username, password_hash, role FROM users WHERE username = ?', (username,))
-    row = cursor.fetchone()
-    return row if row else None
+    return db.get_user_by_username(username)
 
 def authenticate_user(username: str, password: str):
     user = get_user_by_username(username)
@@ -66,33 +76,26 @@ def authenticate_user(username: str, password: str):
     return user
 
 def create_test_result(username: str, test_result: TestResultCreate):
-    result_id = str(uuid.uuid4())
-    date = datetime.now().isoformat()
-    cursor.execute(
-        'INSERT INTO test_results (id, user_name, test_name, score, date) VALUES (?, ?, ?, ?, ?)',
-        (result_id, username, test_result.test_name, test_result.score, date)
-    )
-    conn.commit()
-    return result_id
+    return db.submit_test_result(username, test_result.test_name, test_result.score)
 
 def get_all_test_results():
-    cursor.execute('''
-        SELECT test_results.test_name, users.username, test_results.score, test_results.date 
-        FROM test_results
-        JOIN users ON test_results.user_id = users.id
-    ''')
-    return cursor.fetchall()
+    return db.get_test_results()
 
 @app.post("/register")
 async def register(user_create: UserCreate):
-    if get_user_by_username(user_create.username):
+    if await run_db(get_user_by_username, user_create.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    try:
+        await run_db_write(create_user, user_create.username, user_create.password, user_create.role)
+    except sqlite3.IntegrityError:
+        # Проверка и вставка выполняются в разных потоках: параллельная регистрация
+        # того же имени между ними упирается в ограничение UNIQUE
         raise HTTPException(status_code=400, detail="Username already registered")
-    create_user(user_create.username, user_create.password, user_create.role)
     return {"message": "User created successfully"}
 
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await run_db(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,34 +106,87 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @app.post("/results")
 async def save_test_result(result: TestResultCreate, token: str = Depends(oauth2_scheme)):
-    cursor.execute('SELECT username, role FROM users WHERE id = ?', (token,))
-    user = cursor.fetchone()
+    user = await run_db(db.get_user_by_token, token)
     if not user or user[1] != 'student':
         raise HTTPException(status_code=403, detail="Only students can save results")
     
-    create_test_result(user[0], result)  # user[0] содержит username
+    # Ответ отправляется только после фиксации пакета с этим результатом
+    await asyncio.wrap_future(create_test_result(user[0], result))  # user[0] содержит username
     return {"message": "Result saved successfully"}
 
+def cursor_key(row, sort):
+    # Значение столбца сортировки и id строки: (id, test_name, user_name, score, date)
+    return (row[4] if RESULT_SORTS[sort][0] == 'date' else row[3]), row[0]
+
+def encode_cursor(row, sort):
+    return base64.urlsafe_b64encode(json.dumps([sort, *cursor_key(row, sort)]).encode()).decode()
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor belongs to another sort order")
+    return value, row_id
+
+def result_to_dict(row):
+    return {"id": row[0], "test_name": row[1], "username": row[2], "score": row[3], "date": row[4]}
+
 @app.get("/results", response_model=List[dict])
-async def get_results(token: str = Depends(oauth2_scheme)):
-    cursor.execute('SELECT role FROM users WHERE id = ?', (token,))
-    user = cursor.fetchone()
-    if not user or user[0] != 'teacher':
+async def get_results(token: str = Depends(oauth2_scheme),
+                      test_name: Optional[str] = None,
+                      username: Optional[str] = None,
+                      date_from: Optional[datetime] = Query(None, description="Не раньше (включительно)"),
+                      date_to: Optional[datetime] = Query(None, description="Раньше (не включительно)"),
+                      score_min: Optional[float] = None,
+                      score_max: Optional[float] = None,
+                      sort: str = Query('-date', pattern='^-?(date|score)$'),
+                      limit: int = Query(RESULTS_PAGE_SIZE, ge=1, le=RESULTS_MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None,
+                      format: str = Query('json', pattern='^(json|ndjson)$')):
+    user = await run_db(db.get_user_by_token, token)
+    if not user or user[1] != 'teacher':
         raise HTTPException(status_code=403, detail="Only teachers can view results")
-    
-    # Теперь получаем username прямо из таблицы результатов
-    cursor.execute('SELECT test_name, user_name, score, date FROM test_results')
-    return [{
-        "test_name": r[0],
-        "username": r[1],
-        "score": r[2],
-        "date": r[3]
-    } for r in cursor.fetchall()]
+
+    # Постраничная выдача по ключу: курсор следующей страницы - в заголовке X-Next-Cursor,
+    # тело остается списком результатов. format=ndjson отдает все подходящие результаты
+    # потоком, читая базу страницами, так что память сервера не зависит от их числа
+    filters = {
+        'test_name': test_name,
+        'user_name': username,
+        'date_from': date_from.isoformat() if date_from else None,
+        'date_to': date_to.isoformat() if date_to else None,
+        'score_min': score_min,
+        'score_max': score_max,
+        'sort': sort,
+    }
+    after = decode_cursor(cursor, sort) if cursor else None
+
+    if format == 'ndjson':
+        async def export(after=after):
+            while True:
+                rows = await run_db(functools.partial(db.list_results, limit=RESULTS_MAX_PAGE_SIZE,
+                                                      after=after, **filters))
+                if not rows:
+                    break
+                yield ''.join(json.dumps(result_to_dict(r), ensure_ascii=False) + '\n' for r in rows)
+                if len(rows) < RESULTS_MAX_PAGE_SIZE:
+                    break
+                after = cursor_key(rows[-1], sort)
+
+        return StreamingResponse(export(), media_type='application/x-ndjson')
+
+    rows = await run_db(functools.partial(db.list_results, limit=limit + 1, after=after, **filters))
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(rows[-1], sort)
+    return JSONResponse([result_to_dict(r) for r in rows], headers=headers)
 
 @app.get("/me")
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    cursor.execute('SELECT username, role FROM users WHERE id = ?', (token,))
-    user = cursor.fetchone()
+    user = await run_db(db.get_user_by_token, token)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"username": user[0], "role": user[1]}
\ No newline at end of file
@@ -0,0 +1,363 @@
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+# Запросы - постоянные строки: sqlite3 кэширует подготовленные выражения
+# для каждого соединения по тексту запроса, поэтому повторный вызов не
+# компилирует SQL заново
+INSERT_USER = 'INSERT INTO users (id, username, password_hash, role) VALUES (?, ?, ?, ?)'
+SELECT_USER_BY_NAME = 'SELECT id, username, password_hash, role FROM users WHERE username = ?'
+SELECT_USER_BY_ID = 'SELECT username, role FROM users WHERE id = ?'
+INSERT_RESULT = 'INSERT INTO test_results (user_name, test_name, score, date) VALUES (?, ?, ?, ?)'
+SELECT_RESULTS = 'SELECT test_name, user_name, score, date FROM test_results ORDER BY id'
+
+# Миграции схемы: (версия, описание, запросы). Каждая выполняется в своей транзакции,
+# примененные версии записываются в schema_migrations. Новые миграции только
+# добавляются в конец списка, примененные не меняются
+MIGRATIONS = [
+    (1, 'Исходная схема', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_results (
+            id TEXT PRIMARY KEY,
+            user_name TEXT,
+            test_name TEXT,
+            score REAL,
+            date TEXT
+        )
+        ''',
+    ]),
+    (2, 'Целочисленные ключи результатов и индексы по пользователю и тесту', [
+        # Случайные UUID в текстовом первичном ключе вставляются в произвольные места
+        # B-дерева; INTEGER PRIMARY KEY - это rowid, новые строки дописываются в конец
+        '''
+        CREATE TABLE test_results_new (
+            id INTEGER PRIMARY KEY,
+            user_name TEXT NOT NULL,
+            test_name TEXT NOT NULL,
+            score REAL NOT NULL,
+            date TEXT NOT NULL
+        )
+        ''',
+        '''
+        INSERT INTO test_results_new (user_name, test_name, score, date)
+        SELECT user_name, test_name, score, date FROM test_results ORDER BY date, rowid
+        ''',
+        'DROP TABLE test_results',
+        'ALTER TABLE test_results_new RENAME TO test_results',
+        'CREATE INDEX idx_test_results_user_date ON test_results (user_name, date)',
+        'CREATE INDEX idx_test_results_test_date ON test_results (test_name, date)',
+    ]),
+    (3, 'Индексы для сортировки результатов по дате и баллу', [
+        # rowid входит в каждый индекс, так что порядок (date, id) и (score, id)
+        # для постраничной выборки читается из индекса без сортировки
+        'CREATE INDEX idx_test_results_date ON test_results (date)',
+        'CREATE INDEX idx_test_results_score ON test_results (score)',
+    ]),
+]
+
+# Допустимые сортировки результатов: параметр запроса -> (столбец, направление)
+RESULT_SORTS = {
+    'date': ('date', 'ASC'),
+    '-date': ('date', 'DESC'),
+    'score': ('score', 'ASC'),
+    '-score': ('score', 'DESC'),
+}
+
+PRAGMAS = (
+    # WAL: читатели не блокируют писателя и друг друга
+    'PRAGMA journal_mode=WAL',
+    # В режиме WAL NORMAL сохраняет целостность базы, fsync - только при контрольной точке
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON',
+)
+
+
+class ConnectionPool:
+    """Пул соединений SQLite.
+
+    Соединения создаются по мере надобности, но не больше size; каждое
+    соединение в каждый момент используется только одним потоком, поэтому
+    check_same_thread отключен лишь для передачи соединений между потоками.
+    """
+
+    def __init__(self, path, size=8, timeout=30.0, cached_statements=256):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Нет свободных соединений с базой данных")
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        # Фиксация при успешном выходе, откат при исключении
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._created = 0
+            self._idle = queue.LifoQueue()
+
+
+class GroupCommitWriter:
+    """Групповая фиксация вставок.
+
+    submit(params) ставит строку в очередь и возвращает Future. Поток записи
+    берет первую строку, еще max_delay секунд собирает следующие (не больше
+    max_batch) и вставляет их в одной транзакции. Соединение записи работает
+    с synchronous=FULL, поэтому Future завершается, только когда пакет записан
+    на диск, а стоимость fsync делится на все строки пакета.
+    """
+
+    def __init__(self, pool, statement, max_delay=0.005, max_batch=500):
+        self.statement = statement
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._conn = pool._connect()
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='db-group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, params):
+        future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Запись в базу данных остановлена"))
+            return future
+        self._queue.put((params, future))
+        return future
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Остановка: текущий пакет дописывается, затем поток завершается
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = []
+            try:
+                # Ожидающий запрос мог быть отменен (таймаут, остановка сервера):
+                # set_running_or_notify_cancel переводит Future в состояние
+                # выполнения, после чего отменить его уже нельзя, а отмененные
+                # строки в пакет не попадают
+                batch = [(params, future) for params, future in self._collect(first)
+                         if future.set_running_or_notify_cancel()]
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                # Сбой одного пакета не должен останавливать поток записи
+                for _, future in batch:
+                    self._fail(future, e)
+        self._conn.close()
+
+    def _write_batch(self, batch):
+        try:
+            with self._conn:
+                row_ids = [self._conn.execute(self.statement, params).lastrowid for params, _ in batch]
+        except Exception:
+            # Пакет откатился целиком; строки записываются по одной, чтобы
+            # ошибка одной строки не отменяла остальные
+            for params, future in batch:
+                self._write_one(params, future)
+        else:
+            for (_, future), row_id in zip(batch, row_ids):
+                self._resolve(future, row_id)
+
+    def _write_one(self, params, future):
+        try:
+            with self._conn:
+                row_id = self._conn.execute(self.statement, params).lastrowid
+        except Exception as e:
+            self._fail(future, e)
+        else:
+            self._resolve(future, row_id)
+
+    @staticmethod
+    def _resolve(future, row_id):
+        if not future.done():
+            future.set_result(row_id)
+
+    @staticmethod
+    def _fail(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+
+class Database:
+    """Слой доступа к данным сервера: каждый вызов берет соединение из пула."""
+
+    def __init__(self, path, pool_size=8, batch_delay=0.005, max_batch=500):
+        self.pool = ConnectionPool(path, size=pool_size)
+        self.create_schema()
+        self.results_writer = GroupCommitWriter(self.pool, INSERT_RESULT, batch_delay, max_batch)
+
+    def create_schema(self):
+        return self.migrate()
+
+    def schema_version(self):
+        with self.pool.connection() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self, migrations=MIGRATIONS):
+        # BEGIN IMMEDIATE сразу берет блокировку записи: два процесса сервера,
+        # запущенные одновременно, не применят одну миграцию дважды
+        applied = []
+        with self.pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TEXT NOT NULL
+                )
+            ''')
+            for version, description, statements in migrations:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    done = conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone()
+                    if not done:
+                        for statement in statements:
+                            conn.execute(statement)
+                        conn.execute('INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)',
+                                     (version, description, datetime.now().isoformat()))
+                        conn.execute(f'PRAGMA user_version = {int(version)}')
+                        applied.append(version)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        return applied
+
+    def create_user(self, username, password_hash, role):
+        user_id = str(uuid.uuid4())
+        with self.pool.transaction() as conn:
+            conn.execute(INSERT_USER, (user_id, username, password_hash, role))
+        return user_id
+
+    def get_user_by_username(self, username):
+        with self.pool.connection() as conn:
+            return conn.execute(SELECT_USER_BY_NAME, (username,)).fetchone()
+
+    def get_user_by_token(self, token):
+        with self.pool.connection() as conn:
+            return conn.execute(SELECT_USER_BY_ID, (token,)).fetchone()
+
+    def submit_test_result(self, username, test_name, score):
+        # Future завершается идентификатором строки после фиксации пакета, в который попал результат
+        return self.results_writer.submit((username, test_name, score, datetime.now().isoformat()))
+
+    def create_test_result(self, username, test_name, score):
+        return self.submit_test_result(username, test_name, score).result()
+
+    def get_test_results(self):
+        with self.pool.connection() as conn:
+            return conn.execute(SELECT_RESULTS).fetchall()
+
+    def list_results(self, test_name=None, user_name=None, date_from=None, date_to=None,
+                     score_min=None, score_max=None, sort='-date', limit=100, after=None):
+        # Постраничная выборка по ключу: after - (значение столбца сортировки, id)
+        # последней строки предыдущей страницы, поэтому страница читается из индекса
+        # без OFFSET и стоит одинаково в начале и в конце списка.
+        # Строки: (id, test_name, user_name, score, date); date_to не включается
+        column, direction = RESULT_SORTS[sort]
+        conditions, params = [], []
+        for clause, value in (('test_name = ?', test_name), ('user_name = ?', user_name),
+                              ('date >= ?', date_from), ('date < ?', date_to),
+                              ('score >= ?', score_min), ('score <= ?', score_max)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        if after is not None:
+            conditions.append(f'({column}, id) {">" if direction == "ASC" else "<"} (?, ?)')
+            params.extend(after)
+        query = 'SELECT id, test_name, user_name, score, date FROM test_results'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY {column} {direction}, id {direction} LIMIT ?'
+        params.append(limit)
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def close(self):
+        self.results_writer.close()
+        self.pool.close()
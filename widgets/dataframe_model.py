@@ -0,0 +1,67 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+import numpy as np
+import pandas as pd
+
+
+class DataFrameModel(QAbstractTableModel):
+    """Модель Qt поверх DataFrame.
+
+    Значения не копируются в элементы таблицы: представление запрашивает только
+    видимые ячейки, и текст строится из массивов столбцов в момент отрисовки.
+    Если задан index_label, первым столбцом выводится индекс таблицы.
+    """
+
+    def __init__(self, df=None, index_label=None, parent=None):
+        super().__init__(parent)
+        self._columns = []
+        self._headers = []
+        self._rows = 0
+        self.set_frame(df, index_label)
+
+    @staticmethod
+    def _column_values(values):
+        # Для обычных dtype берём массив NumPy без копирования, для категорий,
+        # дат и nullable-типов — массив pandas, который индексируется так же
+        if isinstance(values, pd.Index):
+            values = pd.Series(values)
+        if isinstance(values.dtype, np.dtype):
+            return values.to_numpy()
+        return values.array
+
+    def set_frame(self, df, index_label=None):
+        self.beginResetModel()
+        self._columns = []
+        self._headers = []
+        self._rows = 0
+        if df is not None:
+            self._rows = len(df)
+            if index_label is not None:
+                self._columns.append(self._column_values(df.index.to_flat_index()))
+                self._headers.append(index_label)
+            for i, name in enumerate(df.columns):
+                self._columns.append(self._column_values(df.iloc[:, i]))
+                self._headers.append(name)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self._columns[index.column()][index.row()])
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self._headers[section])
+        return str(section + 1)
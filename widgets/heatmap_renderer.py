@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+
+
+class HeatmapRenderer:
+    """Тепловая карта для таблиц любого размера.
+
+    Видимая часть таблицы выводится через imshow не более чем в max_cells
+    ячеек по каждой оси: соседние ячейки объединяются в блоки и заменяются
+    средним значением. При масштабировании и сдвиге осей блоки и подписи
+    пересчитываются для новой области, так что при приближении видны
+    отдельные ячейки. Подписи прореживаются до max_ticks по каждой оси.
+    """
+
+    def __init__(self, ax, data, row_labels, col_labels, max_cells=400, max_ticks=30, cmap='coolwarm'):
+        self.ax = ax
+        self.data = np.asarray(data, dtype=float)
+        self.row_labels = [str(label) for label in row_labels]
+        self.col_labels = [str(label) for label in col_labels]
+        self.max_cells = max_cells
+        self.max_ticks = max_ticks
+        n_rows, n_cols = self.data.shape
+        finite = self.data[np.isfinite(self.data)]
+        vmin, vmax = (finite.min(), finite.max()) if finite.size else (0.0, 1.0)
+        self.image = ax.imshow(np.zeros((1, 1)), cmap=cmap, aspect='auto', interpolation='nearest',
+                               vmin=vmin, vmax=vmax)
+        ax.set_autoscale_on(False)
+        ax.set_xlim(-0.5, n_cols - 0.5)
+        ax.set_ylim(n_rows - 0.5, -0.5)
+        self._view = None
+        self.update()
+        # Лямбды, а не связанные методы: реестр обратных вызовов matplotlib
+        # хранит методы по слабым ссылкам, и отрисовщик был бы удален сборщиком мусора
+        ax.callbacks.connect('xlim_changed', lambda _: self.update())
+        ax.callbacks.connect('ylim_changed', lambda _: self.update())
+
+    @staticmethod
+    def _visible(limits, size):
+        lo, hi = sorted(limits)
+        start = min(max(int(math.floor(lo + 0.5)), 0), max(size - 1, 0))
+        stop = max(min(int(math.ceil(hi + 0.5)), size), start + 1)
+        return start, stop
+
+    @staticmethod
+    def _block_means(data, axis, start, stop, step):
+        bounds = np.arange(start, stop, step)
+        sums = np.add.reduceat(data.take(np.arange(start, stop), axis=axis), bounds - start, axis=axis)
+        sizes = np.diff(np.append(bounds, stop))
+        shape = [1, 1]
+        shape[axis] = len(sizes)
+        return sums / sizes.reshape(shape)
+
+    def _ticks(self, start, stop, labels):
+        step = max(1, math.ceil((stop - start) / self.max_ticks))
+        positions = np.arange(start, stop, step)
+        return positions, [labels[i] for i in positions]
+
+    def update(self):
+        n_rows, n_cols = self.data.shape
+        rows = self._visible(self.ax.get_ylim(), n_rows)
+        cols = self._visible(self.ax.get_xlim(), n_cols)
+        row_step = max(1, math.ceil((rows[1] - rows[0]) / self.max_cells))
+        col_step = max(1, math.ceil((cols[1] - cols[0]) / self.max_cells))
+        view = rows + cols + (row_step, col_step)
+        if view == self._view:
+            return
+        self._view = view
+        block = self._block_means(self.data, 0, rows[0], rows[1], row_step)
+        block = self._block_means(block, 1, cols[0], cols[1], col_step)
+        self.image.set_data(block)
+        # Блоки одинаковой ширины: последний может выходить за край таблицы
+        self.image.set_extent((cols[0] - 0.5, cols[0] + block.shape[1] * col_step - 0.5,
+                               rows[0] + block.shape[0] * row_step - 0.5, rows[0] - 0.5))
+        x_ticks, x_labels = self._ticks(*cols, self.col_labels)
+        y_ticks, y_labels = self._ticks(*rows, self.row_labels)
+        font_size = 8 if max(len(x_ticks), len(y_ticks)) > 15 else 10
+        self.ax.set_xticks(x_ticks, x_labels, rotation=45, ha='right', fontsize=font_size)
+        self.ax.set_yticks(y_ticks, y_labels, fontsize=font_size)
+        if self.ax.figure.canvas is not None:
+            self.ax.figure.canvas.draw_idle()
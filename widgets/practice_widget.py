@@ -1,22 +1,31 @@
-import io
+import functools
+import inspect
 import os
 
-import requests
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QGroupBox, QLabel, QPushButton, QComboBox,
-    QTableWidget, QTableWidgetItem, QTabWidget, QTextEdit, QCheckBox, QHBoxLayout, QListWidget, QMessageBox,
-    QFileDialog, QHeaderView
+    QTableView, QTabWidget, QTextEdit, QCheckBox, QHBoxLayout, QListWidget, QMessageBox,
+    QFileDialog, QHeaderView, QSpinBox, QLineEdit, QProgressBar
 )
 from PyQt5.QtCore import Qt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 
 import numpy as np
 import pandas as pd
 
-from analysis import PracticeAnalysis, interpret_p_value, interpret_cramers_v, interpret_phi, \
+from analysis import AnalysisCache, DatasetCache, PracticeAnalysis, SparseContingencyTable, interpret_p_value, interpret_cramers_v, interpret_phi, \
     interpret_contingency_coefficient, interpret_odds_ratio, interpret_goodman_kruskal_tau
 from dialogs import GitHubDialog, ManualInputDialog
+from widgets.dataframe_model import DataFrameModel
+from widgets.heatmap_renderer import HeatmapRenderer
+from widgets.task_runner import TaskRunner
+
+# Пределы числа категорий на диаграммах: остальные объединяются в «Другие»
+MAX_BAR_GROUPS = 20
+MAX_BAR_SERIES = 10
+MAX_PIE_SLICES = 10
 
 
 class PracticeWidget(QWidget):
@@ -24,18 +33,46 @@ class PracticeWidget(QWidget):
         super().__init__()
         self.df = None
         self.current_table = None
+        self.analysis_cache = AnalysisCache(
+            max_entries=64, path=os.path.join(os.path.expanduser('~'), '.practice_analysis_cache.pkl'))
+        self.dataset_cache = DatasetCache(os.path.join(os.path.expanduser('~'), '.practice_dataset_cache'))
         self.selected_source = None
         self.selected_columns = []
         self.selected_method = None
         self.methods = {
             'Хи-квадрат Пирсона': PracticeAnalysis.chi_square,
+            'Хи-квадрат (Монте-Карло)': PracticeAnalysis.chi_square_monte_carlo,
             'Точный тест Фишера': PracticeAnalysis.fishers_exact,
+            'Точный тест Фримана-Холтона': PracticeAnalysis.freeman_halton,
             'Коэффициент Крамера V': PracticeAnalysis.cramers_v,
             'Коэффициент сопряженности': PracticeAnalysis.contingency_coefficient,
             'Коэффициент Фи': PracticeAnalysis.phi_coefficient,
             'Отношение шансов': PracticeAnalysis.odds_ratio,
-            'Тау-коэффициент Гудмана-Краскела': PracticeAnalysis.goodman_kruskal_tau
+            'Тау-коэффициент Гудмана-Краскела': PracticeAnalysis.goodman_kruskal_tau,
+            'Стратифицированный анализ (CMH)': PracticeAnalysis.cochran_mantel_haenszel,
+            'Все меры связи': PracticeAnalysis.all_measures,
+            'Меры связи с бутстреп-интервалами': PracticeAnalysis.bootstrap_measures
+        }
+
+        self.binning_methods = {
+            'Без разбиения': None,
+            'Равные интервалы': 'equal_width',
+            'Квантили': 'quantile',
+            'Свои границы': 'custom'
         }
+        # Разбитый на интервалы набор данных: исходный DataFrame, настройки и результат
+        self.binned_source = None
+        self.binned_key = None
+        self.binned_df = None
+        # Графики строятся при первом открытии вкладки и хранятся, пока не изменится таблица
+        self.chart_table = None
+        self.chart_key = None
+        self.charts = {}
+
+        self.tasks = TaskRunner(self)
+        self.tasks.started.connect(self._task_started)
+        self.tasks.progress.connect(self._task_progress)
+        self.tasks.stopped.connect(self._task_stopped)
 
         self.current_step = 0
         self.remove_na_checkbox = QCheckBox("Удалить строки с пропусками в выбранных столбцах")
@@ -48,10 +85,23 @@ class PracticeWidget(QWidget):
         self.source_info = QLabel("Источник данных: не выбран")
         self.columns_info = QLabel("Выбранные столбцы: нет")
         self.method_info = QLabel("Метод анализа: не выбран")
+        self.memory_info = QLabel("Память данных: нет данных")
         settings_layout.addWidget(self.source_info)
         settings_layout.addWidget(self.columns_info)
         settings_layout.addWidget(self.method_info)
+        settings_layout.addWidget(self.memory_info)
         self.settings_panel.setLayout(settings_layout)
+        self.task_panel = QWidget()
+        task_layout = QHBoxLayout()
+        task_layout.setContentsMargins(0, 0, 0, 0)
+        self.task_progress = QProgressBar()
+        self.task_progress.setRange(0, 1000)
+        self.cancel_task_btn = QPushButton("Отменить")
+        self.cancel_task_btn.clicked.connect(self.cancel_task)
+        task_layout.addWidget(self.task_progress)
+        task_layout.addWidget(self.cancel_task_btn)
+        self.task_panel.setLayout(task_layout)
+        self.task_panel.setVisible(False)
         self.step1_group = QGroupBox("Шаг 1: Источник данных")
         step1_layout = QVBoxLayout()
         data_btn_layout = QHBoxLayout()
@@ -78,7 +128,7 @@ class PracticeWidget(QWidget):
         self.step2_group.setVisible(False)
         step2_layout = QVBoxLayout()
         data_and_columns_layout = QHBoxLayout()
-        self.data_table = QTableWidget()
+        self.data_table = self._create_table_view()
         data_and_columns_layout.addWidget(self.data_table)
         columns_layout = QVBoxLayout()
         self.column_list = QListWidget()
@@ -86,6 +136,25 @@ class PracticeWidget(QWidget):
         columns_layout.addWidget(QLabel("Выберите минимум 2 столбца:"))
         columns_layout.addWidget(self.column_list)
         columns_layout.addWidget(self.remove_na_checkbox)
+        binning_layout = QHBoxLayout()
+        self.binning_combo = QComboBox()
+        self.binning_combo.addItems(self.binning_methods.keys())
+        self.bins_spin = QSpinBox()
+        self.bins_spin.setRange(2, 50)
+        self.bins_spin.setValue(10)
+        binning_layout.addWidget(QLabel("Числовые столбцы:"))
+        binning_layout.addWidget(self.binning_combo)
+        binning_layout.addWidget(QLabel("интервалов:"))
+        binning_layout.addWidget(self.bins_spin)
+        edges_layout = QHBoxLayout()
+        self.bin_column_combo = QComboBox()
+        self.bin_edges_edit = QLineEdit()
+        self.bin_edges_edit.setPlaceholderText("Свои границы через запятую, например: 0, 18, 35, 60")
+        edges_layout.addWidget(QLabel("Границы для столбца:"))
+        edges_layout.addWidget(self.bin_column_combo)
+        edges_layout.addWidget(self.bin_edges_edit)
+        columns_layout.addLayout(binning_layout)
+        columns_layout.addLayout(edges_layout)
         data_and_columns_layout.addLayout(columns_layout)
         step2_layout.addLayout(data_and_columns_layout)
         step2_btn_layout = QHBoxLayout()
@@ -118,8 +187,9 @@ class PracticeWidget(QWidget):
         self.step4_group.setVisible(False)
         step4_layout = QVBoxLayout()
         self.visualization_tabs = QTabWidget()
-        self.raw_data_tab = QTableWidget()
-        self.contingency_table = QTableWidget()
+        self.raw_data_tab = self._create_table_view()
+        self.raw_data_tab.verticalHeader().setVisible(False)
+        self.contingency_table = self._create_table_view()
         self.heatmap_tab = QWidget()
         self.bar_chart_tab = QWidget()
         self.pie_chart_tab = QWidget()
@@ -128,6 +198,12 @@ class PracticeWidget(QWidget):
         self.visualization_tabs.addTab(self.heatmap_tab, "Тепловая карта")
         self.visualization_tabs.addTab(self.bar_chart_tab, "Столбчатая")
         self.visualization_tabs.addTab(self.pie_chart_tab, "Круговая")
+        self.visualization_tabs.currentChanged.connect(self.render_current_chart)
+        self.chart_builders = {
+            self.heatmap_tab: (self.heatmap_figure, self.interpret_heatmap),
+            self.bar_chart_tab: (self.bar_chart_figure, self.interpret_bar_chart),
+            self.pie_chart_tab: (self.pie_chart_figure, self.interpret_pie_chart),
+        }
         self.results_text = QTextEdit()
         self.results_text.setReadOnly(True)
         self.interpretation_text = QTextEdit()
@@ -153,12 +229,24 @@ class PracticeWidget(QWidget):
         step4_layout.addLayout(main_layout)
         self.step4_group.setLayout(step4_layout)
         self.layout.addWidget(self.settings_panel)
+        self.layout.addWidget(self.task_panel)
         self.layout.addWidget(self.step1_group)
         self.layout.addWidget(self.step2_group)
         self.layout.addWidget(self.step3_group)
         self.layout.addWidget(self.step4_group)
         self.setLayout(self.layout)
 
+    @staticmethod
+    def _create_table_view():
+        # Таблицы показывают DataFrame через модель: отрисовываются только видимые
+        # строки, поэтому размер файла не влияет на время отображения
+        view = QTableView()
+        view.setModel(DataFrameModel(parent=view))
+        view.setEditTriggers(QTableView.NoEditTriggers)
+        view.setAlternatingRowColors(True)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        return view
+
     def load_from_github(self):
         try:
             dialog = GitHubDialog(self)
@@ -170,24 +258,58 @@ class PracticeWidget(QWidget):
                 self.selected_source = f"GitHub: {selected_file}"
                 self._update_settings_display()
                 raw_url = f"https://raw.githubusercontent.com/huimorzhaa/Analysis-of-conjugacy-tables/main/{selected_file}"
-                response = requests.get(raw_url)
-                response.raise_for_status()
-                self.df = pd.read_csv(io.StringIO(response.text))
-                self.update_data_display()
-                self.update_column_list()
-                self.load_status.setText(f"✓ Данные загружены из GitHub: {selected_file}")
-                self.load_status.setStyleSheet("color: green; font-weight: bold;")
-                self.step1_next_btn.setEnabled(True)
-                self.selected_source = f"GitHub - {selected_file} "
-                self._update_settings_display()
+
+                def load(task):
+                    df = PracticeAnalysis.load_remote_data(raw_url, cache=self.dataset_cache)
+                    task.check()
+                    return PracticeAnalysis.optimize_dtypes(df)
+
+                self.tasks.run(load,
+                               lambda loaded: self._data_loaded(loaded, f"✓ Данные загружены из GitHub: {selected_file}",
+                                                                f"GitHub - {selected_file} "),
+                               self._github_failed, "Загрузка из GitHub")
         except Exception as e:
-            self.selected_source = "Ошибка загрузки"
-            self.load_status.setStyleSheet("font-weight: bold; color: #666;")
-            self._update_settings_display()
-            self.load_status.setText("Ошибка загрузки из GitHub")
-            self.load_status.setStyleSheet("font-weight: bold; color: #666;")
-            #QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки:\n{str(e)}")
-            self.reset_ui()
+            self._github_failed(e)
+
+    def _github_failed(self, error):
+        self.selected_source = "Ошибка загрузки"
+        self.load_status.setStyleSheet("font-weight: bold; color: #666;")
+        self._update_settings_display()
+        self.load_status.setText("Ошибка загрузки из GitHub")
+        self.load_status.setStyleSheet("font-weight: bold; color: #666;")
+        #QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки:\n{str(error)}")
+        self.reset_ui()
+
+    def _data_loaded(self, loaded, status, source):
+        self.df, before, after = loaded
+        self._show_memory(before, after)
+        self.update_data_display()
+        self.update_column_list()
+        self.load_status.setText(status)
+        self.load_status.setStyleSheet("color: green; font-weight: bold;")
+        self.step1_next_btn.setEnabled(True)
+        self.selected_source = source
+        self._update_settings_display()
+
+    def _task_started(self, label):
+        self.task_progress.setValue(0)
+        self.task_progress.setFormat(f"{label}: %p%")
+        self.task_panel.setVisible(True)
+        for button in (self.load_btn, self.manual_btn, self.github_btn, self.analyze_btn, self.step3_back_btn):
+            button.setEnabled(False)
+
+    def _task_progress(self, label, share):
+        self.task_progress.setValue(int(share * 1000))
+
+    def _task_stopped(self):
+        self.task_panel.setVisible(False)
+        for button in (self.load_btn, self.manual_btn, self.github_btn, self.analyze_btn, self.step3_back_btn):
+            button.setEnabled(True)
+
+    def cancel_task(self):
+        self.tasks.cancel()
+        # Прерванный график будет построен заново при следующем открытии вкладки
+        self.charts = {tab: chart for tab, chart in self.charts.items() if chart is not None}
 
     def _update_settings_display(self):
         source_text = self.selected_source or "не выбран"
@@ -197,6 +319,13 @@ class PracticeWidget(QWidget):
         self.columns_info.setText(f"Выбранные столбцы: {columns_text}")
         self.method_info.setText(f"Метод анализа: {method_text}")
 
+    def optimize_loaded_data(self):
+        self.df, before, after = PracticeAnalysis.optimize_dtypes(self.df)
+        self._show_memory(before, after)
+
+    def _show_memory(self, before, after):
+        self.memory_info.setText(f"Память данных: {before / 2 ** 20:.2f} МБ → {after / 2 ** 20:.2f} МБ")
+
     def next_step(self):
         try:
             if self.current_step == 0:
@@ -251,15 +380,20 @@ class PracticeWidget(QWidget):
             self.reset_ui()
 
     def reset_ui(self):
+        self.tasks.cancel()
         self.selected_source = None
         self.selected_columns = []
         self.selected_method = None
         self._update_settings_display()
         self.df = None
         self.current_table = None
-        self.data_table.clear()
+        self.binned_source = None
+        self.binned_key = None
+        self.binned_df = None
+        self.memory_info.setText("Память данных: нет данных")
+        self.data_table.model().set_frame(None)
         self.column_list.clear()
-        self.contingency_table.clear()
+        self.contingency_table.model().set_frame(None)
         self.results_text.clear()
         self.clear_visualizations()
         self.current_step = 0
@@ -275,21 +409,23 @@ class PracticeWidget(QWidget):
         path, _ = QFileDialog.getOpenFileName(self, "Открыть CSV", "", "CSV Files (*.csv)")
         if not path:
             return
-        try:
-            self.df = PracticeAnalysis.load_data(path)
-            self.update_data_display()
-            self.update_column_list()
-            self.load_status.setText(f"✓ Данные загружены из файла: {os.path.basename(path)}")
-            self.load_status.setStyleSheet("color: green; font-weight: bold;")
-            self.step1_next_btn.setEnabled(True)
-            self.selected_source = f"Файл: {os.path.basename(path)}"
-            self._update_settings_display()
-        except pd.errors.ParserError as e:
-            self.df = None
-            self.load_status.setText(f"Ошибка формата CSV: {e}")
-        except Exception as e:
-            self.df = None
-            self.load_status.setText(f"Ошибка загрузки файла: {e}")
+        name = os.path.basename(path)
+
+        def load(task):
+            df = PracticeAnalysis.load_data(path, cache=self.dataset_cache)
+            task.check()
+            return PracticeAnalysis.optimize_dtypes(df)
+
+        self.tasks.run(load, lambda loaded: self._data_loaded(loaded, f"✓ Данные загружены из файла: {name}",
+                                                              f"Файл: {name}"),
+                       self._csv_failed, "Загрузка файла")
+
+    def _csv_failed(self, error):
+        self.df = None
+        if isinstance(error, pd.errors.ParserError):
+            self.load_status.setText(f"Ошибка формата CSV: {error}")
+        else:
+            self.load_status.setText(f"Ошибка загрузки файла: {error}")
             self.load_status.setStyleSheet("font-weight: bold; color: #666;")
 
     def manual_input(self):
@@ -321,6 +457,7 @@ class PracticeWidget(QWidget):
 
                 columns = [f"Признак {i + 1}" for i in range(cols)]
                 self.df = pd.DataFrame(data, columns=columns)
+                self.optimize_loaded_data()
                 self.update_data_display()
                 self.update_column_list()
                 self.load_status.setText("✓ Данные введены вручную")
@@ -336,21 +473,19 @@ class PracticeWidget(QWidget):
                 self.reset_ui()
 
     def update_data_display(self):
-        self.data_table.clear()
+        self.data_table.model().set_frame(self.df)
         if self.df is not None:
-            self.data_table.setRowCount(self.df.shape[0])
-            self.data_table.setColumnCount(self.df.shape[1])
-            self.data_table.setHorizontalHeaderLabels(self.df.columns)
-            for row in range(self.df.shape[0]):
-                for col in range(self.df.shape[1]):
-                    item = QTableWidgetItem(str(self.df.iat[row, col]))
-                    self.data_table.setItem(row, col, item)
             self.data_table.resizeColumnsToContents()
 
     def update_column_list(self):
         self.column_list.clear()
+        self.bin_column_combo.clear()
+        self.binned_source = self.binned_key = self.binned_df = None
         if self.df is not None:
             self.column_list.addItems(self.df.columns)
+            self.bin_column_combo.addItems([str(col) for col in self.df.columns
+                                            if pd.api.types.is_numeric_dtype(self.df[col])
+                                            and not pd.api.types.is_bool_dtype(self.df[col])])
             self.column_list.itemSelectionChanged.connect(self.check_selection)
         self.column_list.itemSelectionChanged.connect(self._update_columns_selection)
 
@@ -374,28 +509,93 @@ class PracticeWidget(QWidget):
             else:
                 df_filtered = self.df
             self.filtered_df = df_filtered
-            contingency_table = PracticeAnalysis.create_contingency_table(df_filtered, selected)
+            binning = self.binning_settings()
+            # Снимок кэша интервалов: задача только читает его, а обновляется он
+            # в потоке интерфейса после завершения анализа
+            df, binned = self.df, (self.binned_source, self.binned_key, self.binned_df)
+            method_name = self.method_combo.currentText()
+            method = self.methods[method_name]
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка анализа", str(e))
+            self.reset_ui()
+            return
+
+        def analyse(task):
+            # pd.crosstab и движок таблиц и так отбрасывают строки с пропусками в выбранных
+            # столбцах, поэтому таблица строится по всем данным: коды категорий кэшируются для них
+            binned_key, binned_df = self.binned_data(df, selected, binned, *binning)
+            contingency_table = PracticeAnalysis.create_contingency_table(binned_df, selected, use_cache=True)
+            task.check()
+            display_table = contingency_table
+            if isinstance(contingency_table, SparseContingencyTable):
+                # Разреженную таблицу показываем только по самым частым категориям
+                display_table = contingency_table.to_frame(max_rows=50, max_cols=50)
+            compute = method
+            if 'progress' in inspect.signature(method).parameters:
+                # Долгие методы сообщают о ходе вычисления и прерываются по отмене;
+                # ключ кэша от этого не зависит, так как задается именем метода
+                compute = functools.partial(method, progress=task.progress)
+            result = self.analysis_cache.get_or_compute(contingency_table, method_name, compute)
+            return (df, binned_key, binned_df), contingency_table, display_table, result
+
+        self.tasks.run(analyse, self._analysis_done, self._analysis_failed, "Анализ")
+
+    def _analysis_done(self, outcome):
+        binned, contingency_table, display_table, result = outcome
+        try:
+            if binned[1] is not None and binned[0] is self.df:
+                self.binned_source, self.binned_key, self.binned_df = binned
             self.current_table = contingency_table
-            self.show_contingency_table(contingency_table)
-            self.show_visualizations(contingency_table)
-            method = self.methods[self.method_combo.currentText()]
-            result = method(contingency_table)
+            self.show_visualizations(display_table)
             self.show_results(result)
             self.current_step = 3
             self.step3_group.setVisible(False)
             self.step4_group.setVisible(True)
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка анализа", str(e))
-            self.reset_ui()
+            self._analysis_failed(e)
+
+    def _analysis_failed(self, error):
+        QMessageBox.critical(self, "Ошибка анализа", str(error))
+        self.reset_ui()
+
+    def binning_settings(self):
+        method = self.binning_methods[self.binning_combo.currentText()]
+        edges = None
+        if method == 'custom':
+            # Свои границы относятся к одному выбранному столбцу
+            column = self.bin_column_combo.currentText()
+            if not column:
+                raise ValueError("Выберите числовой столбец для своих границ интервалов")
+            text = self.bin_edges_edit.text().replace(';', ',')
+            try:
+                edges = {column: [float(x) for x in text.split(',') if x.strip()]}
+            except ValueError:
+                raise ValueError("Границы интервалов должны быть числами через запятую")
+        return method, self.bins_spin.value(), edges
+
+    @staticmethod
+    def binned_data(df, selected, binned, method, bins, edges=None):
+        # Выполняется в потоке задачи и не меняет состояние виджета. Разбиваются только
+        # выбранные столбцы; для тех же данных и настроек переиспользуется прежний
+        # результат (binned - снимок кэша), чтобы не пересчитывать коды категорий
+        if method is None:
+            return None, df
+        key = (tuple(selected), method, bins, repr(edges))
+        source, binned_key, binned_df = binned
+        if source is df and binned_key == key:
+            return key, binned_df
+        return key, PracticeAnalysis.bin_numeric_columns(df, selected, method=method, bins=bins, edges=edges)
 
     def show_visualizations(self, df):
         try:
-            self.clear_visualizations()
+            key = AnalysisCache.table_key(df)
+            if key != self.chart_key:
+                self.clear_visualizations()
+                self.chart_table = df
+                self.chart_key = key
             self.show_raw_data()
-            self.create_heatmap(df)
-            self.create_bar_chart(df)
-            self.create_pie_chart(df)
             self.show_contingency_table(df)
+            self.render_current_chart()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка визуализации", f"Ошибка при создании графиков: {str(e)}")
             self.reset_ui()
@@ -409,6 +609,8 @@ class PracticeWidget(QWidget):
                     output.append(f"{k}: {v:.4f}")
                 elif isinstance(v, np.ndarray):
                     output.append(f"{k}:\n{np.array2string(v, precision=2)}")
+                elif isinstance(v, tuple):
+                    output.append(f"{k}: [{v[0]:.4f}; {v[1]:.4f}]")
                 else:
                     output.append(f"{k}: {v}")
                 if k == 'p-значение':
@@ -423,6 +625,15 @@ class PracticeWidget(QWidget):
                     interpretation.append(f"{k}: {interpret_odds_ratio(v)}")
                 elif k == 'Тау-коэффициент':
                     interpretation.append(f"{k}: {interpret_goodman_kruskal_tau(v)}")
+                elif k.startswith('Коэффициент Крамера V,') and k.endswith('(BCa)'):
+                    interpretation.append(f"{k}: от «{interpret_cramers_v(v[0])}» до «{interpret_cramers_v(v[1])}»")
+                elif k.startswith('Коэффициент Фи,') and k.endswith('(BCa)'):
+                    interpretation.append(f"{k}: от «{interpret_phi(abs(v[0]))}» до «{interpret_phi(abs(v[1]))}»")
+                elif k.startswith('Отношение шансов,') and k.endswith('(BCa)'):
+                    if v[0] <= 1 <= v[1]:
+                        interpretation.append(f"{k}: интервал содержит 1, направление связи не установлено")
+                    else:
+                        interpretation.append(f"{k}: интервал не содержит 1, связь значима")
         self.results_text.setPlainText("\n".join(output))
         if interpretation:
             interpretation_text = "\n".join(interpretation)
@@ -432,36 +643,20 @@ class PracticeWidget(QWidget):
 
     def show_contingency_table(self, table):
         try:
-            self.contingency_table.clear()
             if isinstance(table, pd.DataFrame):
-                rows = table.index.tolist()
-                cols = table.columns.tolist()
-                self.contingency_table.setRowCount(len(rows))
-                self.contingency_table.setColumnCount(len(cols) + 1)
-                self.contingency_table.setHorizontalHeaderLabels(["Index"] + [str(c) for c in cols])
-                self.contingency_table.setVerticalHeaderLabels([str(i) for i in range(1, len(rows) + 1)])
-                for i, idx in enumerate(rows):
-                    index_item = QTableWidgetItem(str(idx))
-                    index_item.setTextAlignment(Qt.AlignCenter)
-                    self.contingency_table.setItem(i, 0, index_item)
-                    for j, col in enumerate(cols, start=1):
-                        value = table.loc[idx, col]
-                        item = QTableWidgetItem(str(value))
-                        item.setTextAlignment(Qt.AlignCenter)
-                        self.contingency_table.setItem(i, j, item)
+                self.contingency_table.model().set_frame(table, index_label="Index")
                 self.contingency_table.resizeColumnsToContents()
-                self.contingency_table.setAlternatingRowColors(True)
             else:
-                self.contingency_table.setRowCount(0)
-                self.contingency_table.setColumnCount(0)
+                self.contingency_table.model().set_frame(None)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка таблицы", f"Ошибка отображения таблицы сопряженности:\n{str(e)}")
 
     def clear_visualizations(self):
         try:
-            self.contingency_table.clearContents()
-            self.contingency_table.setRowCount(0)
-            self.contingency_table.setColumnCount(0)
+            self.contingency_table.model().set_frame(None)
+            self.chart_table = None
+            self.chart_key = None
+            self.charts = {}
             for tab in [self.heatmap_tab, self.bar_chart_tab, self.pie_chart_tab]:
                 if tab.layout():
                     while tab.layout().count():
@@ -477,22 +672,10 @@ class PracticeWidget(QWidget):
     def show_raw_data(self):
         try:
             if self.df is not None and not self.df.empty:
-                rows, cols = self.df.shape
-                self.raw_data_tab.setRowCount(rows)
-                self.raw_data_tab.setColumnCount(cols)
-                self.raw_data_tab.setHorizontalHeaderLabels(self.df.columns.tolist())
-                for i in range(rows):
-                    for j in range(cols):
-                        item = QTableWidgetItem(str(self.df.iloc[i, j]))
-                        item.setTextAlignment(Qt.AlignCenter)
-                        self.raw_data_tab.setItem(i, j, item)
-                self.raw_data_tab.setEditTriggers(QTableWidget.NoEditTriggers)
-                self.raw_data_tab.verticalHeader().setVisible(False)
-                self.raw_data_tab.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-                self.raw_data_tab.setAlternatingRowColors(True)
+                self.raw_data_tab.model().set_frame(self.df)
+                self.raw_data_tab.resizeColumnsToContents()
             else:
-                self.raw_data_tab.setRowCount(0)
-                self.raw_data_tab.setColumnCount(0)
+                self.raw_data_tab.model().set_frame(None)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка данных", f"Не удалось отобразить исходные данные: {str(e)}")
 
@@ -584,87 +767,103 @@ class PracticeWidget(QWidget):
         except:
             return "Не удалось проанализировать круговую диаграмму"
 
-    def create_heatmap(self, df):
+    def render_current_chart(self, index=None):
+        tab = self.visualization_tabs.currentWidget()
+        if tab not in self.chart_builders or tab in self.charts or self.chart_table is None:
+            return
+        # Фигуры matplotlib строятся без холста и готовятся вне потока интерфейса
+        build_figure, interpret = self.chart_builders[tab]
+        df, key = self.chart_table, self.chart_key
+        self.charts[tab] = None
+
+        def build(task):
+            return build_figure(df), interpret(df)
+
+        def done(chart):
+            if key == self.chart_key:
+                self.charts[tab] = chart
+                self.show_chart(tab, *chart)
+
+        def failed(error):
+            if key == self.chart_key:
+                self.charts.pop(tab, None)
+            QMessageBox.critical(self, "Ошибка визуализации", f"Ошибка при создании графика: {str(error)}")
+
+        self.tasks.run(build, done, failed, "Построение графика")
+
+    def show_chart(self, tab, fig, interpretation):
+        if tab.layout():
+            QWidget().setLayout(tab.layout())
+        if fig is None:
+            return
+        canvas = FigureCanvas(fig)
+        text_edit = QTextEdit()
+        text_edit.setPlainText(interpretation)
+        text_edit.setReadOnly(True)
+        text_edit.setMaximumHeight(150)
+        layout = QVBoxLayout()
+        if tab is self.heatmap_tab:
+            # Приближение и сдвиг; тепловая карта пересчитывает детализацию для видимой области
+            layout.addWidget(NavigationToolbar(canvas, tab))
+        layout.addWidget(canvas, 70)
+        layout.addWidget(text_edit, 30)
+        tab.setLayout(layout)
+
+    @staticmethod
+    def heatmap_figure(df):
         try:
-            if self.heatmap_tab.layout():
-                QWidget().setLayout(self.heatmap_tab.layout())
             fig = Figure(figsize=(6, 4))
-            canvas = FigureCanvas(fig)
             ax = fig.add_subplot(111)
-            data = df.values.astype(float)
-            cax = ax.matshow(data, cmap='coolwarm')
-            fig.colorbar(cax)
-            ax.set_xticks(range(len(df.columns)))
-            ax.set_xticklabels(df.columns.astype(str), rotation=45)
             if isinstance(df.index, pd.MultiIndex):
                 y_labels = [' | '.join(map(str, idx)) for idx in df.index]
             else:
                 y_labels = df.index.astype(str)
-            ax.set_yticks(range(len(y_labels)))
-            ax.set_yticklabels(y_labels)
+            if isinstance(df.columns, pd.MultiIndex):
+                x_labels = [' | '.join(map(str, col)) for col in df.columns]
+            else:
+                x_labels = df.columns.astype(str)
+            renderer = HeatmapRenderer(ax, df.to_numpy(dtype=float), y_labels, x_labels)
+            fig.colorbar(renderer.image)
             ax.set_title("Тепловая карта")
-            interpretation = self.interpret_heatmap(df)
-            text_edit = QTextEdit()
-            text_edit.setPlainText(interpretation)
-            text_edit.setReadOnly(True)
-            text_edit.setMaximumHeight(150)
-            layout = QVBoxLayout()
-            layout.addWidget(canvas, 70)
-            layout.addWidget(text_edit, 30)
-            self.heatmap_tab.setLayout(layout)
+            return fig
         except Exception as e:
             print(f"Ошибка создания тепловой карты: {str(e)}")
+            return None
 
-    def create_bar_chart(self, df):
+    @staticmethod
+    def bar_chart_figure(df):
         try:
-            if self.bar_chart_tab.layout():
-                QWidget().setLayout(self.bar_chart_tab.layout())
             fig = Figure(figsize=(6, 4))
-            canvas = FigureCanvas(fig)
             ax = fig.add_subplot(111)
-            if isinstance(df.index, pd.MultiIndex):
-                df.index = [' | '.join(map(str, idx)) for idx in df.index]
+            # Для больших таблиц - самые частые категории и «Другие»
+            df = PracticeAnalysis.collapse_categories(df, max_rows=MAX_BAR_GROUPS, max_cols=MAX_BAR_SERIES)
             df.plot(kind='bar', ax=ax)
             ax.legend(title='Категории')
             ax.set_ylabel('Частота')
             ax.set_title('Столбчатая диаграмма')
             ax.grid(True)
-            interpretation = self.interpret_bar_chart(df)
-            text_edit = QTextEdit()
-            text_edit.setPlainText(interpretation)
-            text_edit.setReadOnly(True)
-            text_edit.setMaximumHeight(150)
-            layout = QVBoxLayout()
-            layout.addWidget(canvas, 70)
-            layout.addWidget(text_edit, 30)
-            self.bar_chart_tab.setLayout(layout)
+            return fig
         except Exception as e:
             print(f"Ошибка создания столбчатой диаграммы: {str(e)}")
+            return None
 
-    def create_pie_chart(self, df):
+    @staticmethod
+    def pie_chart_figure(df):
         try:
-            if self.pie_chart_tab.layout():
-                QWidget().setLayout(self.pie_chart_tab.layout())
             fig = Figure(figsize=(6, 4))
-            canvas = FigureCanvas(fig)
             ax = fig.add_subplot(111)
+            sizes = df.sum(axis=1)
             if isinstance(df.index, pd.MultiIndex):
                 labels = [f"{x[0]} | {x[1]}" for x in df.index]
-                sizes = df.sum(axis=1)
             else:
                 labels = df.index.astype(str)
-                sizes = df.sum(axis=1)
+            if len(sizes) > MAX_PIE_SLICES:
+                sizes = PracticeAnalysis.collapse_categories(sizes.to_frame(), max_rows=MAX_PIE_SLICES).iloc[:, 0]
+                labels = sizes.index.astype(str)
             ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
             ax.axis('equal')
             ax.set_title('Круговая диаграмма')
-            interpretation = self.interpret_pie_chart(df)
-            text_edit = QTextEdit()
-            text_edit.setPlainText(interpretation)
-            text_edit.setReadOnly(True)
-            text_edit.setMaximumHeight(150)
-            layout = QVBoxLayout()
-            layout.addWidget(canvas, 70)
-            layout.addWidget(text_edit, 30)
-            self.pie_chart_tab.setLayout(layout)
+            return fig
         except Exception as e:
-            print(f"Ошибка создания круговой диаграммы: {str(e)}")
\ No newline at end of file
+            print(f"Ошибка создания круговой диаграммы: {str(e)}")
+            return None
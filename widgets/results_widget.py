@@ -1,42 +1,156 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView, QPushButton
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QPushButton, QLineEdit,
+                             QComboBox, QLabel)
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
 import requests
 
+from widgets.task_runner import TaskRunner
+
+RESULTS_URL = "http://localhost:8000/results"
+PAGE_SIZE = 200
+
+
+class ResultsModel(QAbstractTableModel):
+    # Результаты подгружаются страницами по мере прокрутки: представление вызывает
+    # fetchMore, когда доходит до конца загруженных строк; курсор следующей
+    # страницы сервер передает в заголовке X-Next-Cursor. Запрос выполняется
+    # через TaskRunner, строки добавляются, когда страница получена
+    headers = ["Тест", "Пользователь", "Результат (%)", "Дата"]
+    failed = pyqtSignal(str)
+
+    def __init__(self, token, tasks, params=None, parent=None):
+        super().__init__(parent)
+        self.token = token
+        self.tasks = tasks
+        self.params = params or {}
+        self.rows = []
+        self.next_cursor = None
+        self.finished = False
+        self.task = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        result = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return result['test_name']
+        if column == 1:
+            return result['username']
+        if column == 2:
+            return f"{result['score']:.1f}"
+        return result['date']
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.finished
+
+    def fetchMore(self, parent=QModelIndex()):
+        # Пока страница загружается, повторные вызовы при прокрутке ничего не делают
+        if parent.isValid() or self.finished or self.task is not None:
+            return
+        params = dict(self.params, limit=PAGE_SIZE)
+        if self.next_cursor:
+            params['cursor'] = self.next_cursor
+        headers = {"Authorization": f"Bearer {self.token}"}
+
+        def fetch(task):
+            response = requests.get(RESULTS_URL, params=params, headers=headers, timeout=30)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code}: {response.text}")
+            return response.json(), response.headers.get('X-Next-Cursor')
+
+        self.task = self.tasks.run(fetch, self._page_loaded, self._page_failed, "Загрузка результатов")
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def _page_failed(self, error):
+        self.task = None
+        self.finished = True
+        self.failed.emit(str(error))
+
+    def _page_loaded(self, outcome):
+        self.task = None
+        page, self.next_cursor = outcome
+        self.finished = not self.next_cursor
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+
 class ResultsDialog(QDialog):
+    sorts = {
+        'Сначала новые': '-date',
+        'Сначала старые': 'date',
+        'По убыванию результата': '-score',
+        'По возрастанию результата': 'score',
+    }
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Результаты тестирования")
         self.setGeometry(100, 100, 800, 600)
-        
+
         layout = QVBoxLayout()
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Тест", "Пользователь", "Результат (%)", "Дата"])
+        filters_layout = QHBoxLayout()
+        self.test_filter = QLineEdit()
+        self.test_filter.setPlaceholderText("Тест")
+        self.user_filter = QLineEdit()
+        self.user_filter.setPlaceholderText("Пользователь")
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(self.sorts.keys())
+        filters_layout.addWidget(self.test_filter)
+        filters_layout.addWidget(self.user_filter)
+        filters_layout.addWidget(self.sort_combo)
+
+        # Несколько потоков: отмененный запрос прежнего фильтра не задерживает новый
+        self.tasks = TaskRunner(self, max_threads=4)
+        self.tasks.started.connect(lambda label: self.status.setText(f"{label}..."))
+        self.tasks.stopped.connect(lambda: self.status.setText(""))
+
+        self.table = QTableView()
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        
+        self.status = QLabel()
+
         self.refresh_btn = QPushButton("Обновить")
         self.refresh_btn.clicked.connect(self.load_results)
-        
+        self.test_filter.returnPressed.connect(self.load_results)
+        self.user_filter.returnPressed.connect(self.load_results)
+        self.sort_combo.currentIndexChanged.connect(self.load_results)
+
+        layout.addLayout(filters_layout)
         layout.addWidget(self.table)
+        layout.addWidget(self.status)
         layout.addWidget(self.refresh_btn)
         self.setLayout(layout)
-        
+
         self.load_results()
 
     def load_results(self):
-        try:
-            response = requests.get(
-                "http://localhost:8000/results",
-                headers={"Authorization": f"Bearer {self.parent().current_token}"}
-            )
-            if response.status_code == 200:
-                results = response.json()
-                self.table.setRowCount(len(results))
-                for row_idx, result in enumerate(results):
-                    self.table.setItem(row_idx, 0, QTableWidgetItem(result['test_name']))
-                    self.table.setItem(row_idx, 1, QTableWidgetItem(result['username']))
-                    self.table.setItem(row_idx, 2, QTableWidgetItem(f"{result['score']:.1f}"))
-                    self.table.setItem(row_idx, 3, QTableWidgetItem(result['date']))
-            else:
-                self.table.setRowCount(0)
-        except Exception as e:
-            self.table.setRowCount(0)
\ No newline at end of file
+        params = {'sort': self.sorts[self.sort_combo.currentText()]}
+        if self.test_filter.text().strip():
+            params['test_name'] = self.test_filter.text().strip()
+        if self.user_filter.text().strip():
+            params['username'] = self.user_filter.text().strip()
+        self.status.setText("")
+        model = ResultsModel(self.parent().current_token, self.tasks, params, self)
+        model.failed.connect(lambda error: self.status.setText(f"Ошибка загрузки: {error}"))
+        old_model = self.table.model()
+        self.table.setModel(model)
+        if old_model is not None:
+            # Результат запроса прежнего фильтра отбрасывается
+            old_model.cancel()
+            old_model.deleteLater()
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class _TaskSignals(QObject):
+    progress = pyqtSignal(object, float)
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+
+class Task(QRunnable):
+    """Задача для пула потоков.
+
+    fn(task) выполняется вне потока интерфейса. Отмена кооперативная:
+    вычисление периодически вызывает task.progress(доля) или task.check(),
+    и после cancel() они прерывают его исключением TaskCancelled.
+    """
+
+    def __init__(self, fn, on_done, on_error=None, label='', progress_interval=0.05):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.label = label
+        self.signals = _TaskSignals()
+        self.progress_interval = progress_interval
+        self._cancelled = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def progress(self, share):
+        self.check()
+        # Частые вызовы из циклов вычислений не должны заваливать интерфейс сигналами
+        now = time.monotonic()
+        if now - self._last_report >= self.progress_interval or share >= 1.0:
+            self._last_report = now
+            self.signals.progress.emit(self, min(max(float(share), 0.0), 1.0))
+
+    def run(self):
+        try:
+            result = self.fn(self)
+            self.check()
+        except Exception as e:
+            self.signals.failed.emit(self, e)
+        else:
+            self.signals.finished.emit(self, result)
+
+
+class TaskRunner(QObject):
+    """Запускает задачи в отдельном потоке и возвращает результаты в поток интерфейса.
+
+    Обработчики on_done(result) и on_error(exception) вызываются в потоке
+    интерфейса; результаты отмененных задач отбрасываются. Сигналы started,
+    progress и stopped нужны для индикатора выполнения.
+    """
+
+    started = pyqtSignal(str)
+    progress = pyqtSignal(str, float)
+    stopped = pyqtSignal()
+
+    def __init__(self, parent=None, max_threads=1):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._tasks = set()
+
+    @property
+    def busy(self):
+        return any(not task.cancelled for task in self._tasks)
+
+    def run(self, fn, on_done, on_error=None, label=''):
+        task = Task(fn, on_done, on_error, label)
+        task.signals.progress.connect(self._on_progress)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        self._tasks.add(task)
+        self.started.emit(label)
+        self.pool.start(task)
+        return task
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        self.stopped.emit()
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _release(self, task):
+        self._tasks.discard(task)
+        if not self.busy:
+            self.stopped.emit()
+
+    def _on_progress(self, task, share):
+        if not task.cancelled:
+            self.progress.emit(task.label, share)
+
+    def _on_finished(self, task, result):
+        cancelled = task.cancelled
+        self._release(task)
+        if not cancelled:
+            task.on_done(result)
+
+    def _on_failed(self, task, error):
+        cancelled = task.cancelled
+        self._release(task)
+        if cancelled or isinstance(error, TaskCancelled):
+            return
+        if task.on_error is not None:
+            task.on_error(error)